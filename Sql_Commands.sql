@@ -29,6 +29,7 @@ CREATE TABLE media_library (
 -- Create indexes to speed up the exists checks
 CREATE INDEX idx_filename ON media_library(filename);
 CREATE INDEX idx_hash ON media_library(file_hash);
+CREATE INDEX idx_media_filename_lower ON media_library ((lower(filename)));
 
 -- Create the trips_config table
 CREATE TABLE trips_config (
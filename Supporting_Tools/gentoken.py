@@ -1,12 +1,19 @@
 import os
+import json
 import pickle
+from functools import lru_cache
 from google_auth_oauthlib.flow import InstalledAppFlow
 
 # MUST match the scope in your main script
 SCOPES = ['https://www.googleapis.com/auth/photoslibrary.appendonly']
 
+@lru_cache(maxsize=None)
+def _load_client_secret(path):
+    """Parses client_secret.json once per process, however many accounts are authenticated."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 def generate_token_for_account():
-    print("--- Google Photos Token Generator ---")
     email = input("Enter the Gmail address you are authenticating: ").strip()
     
     creds_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'creds')
@@ -16,7 +23,7 @@ def generate_token_for_account():
         return
 
     # Initialize the OAuth flow
-    flow = InstalledAppFlow.from_client_secrets_file(client_secret_path, SCOPES)
+    flow = InstalledAppFlow.from_client_config(_load_client_secret(client_secret_path), SCOPES)
     
     # This will open your browser. Log in with the specific email entered above.
     creds = flow.run_local_server(port=0)
@@ -26,10 +33,14 @@ def generate_token_for_account():
     token_path = os.path.join(creds_dir, token_filename)
     os.makedirs(creds_dir, exist_ok=True)
     with open(token_path, 'wb') as token_file:
-        pickle.dump(creds, token_file)
+        pickle.dump(creds, token_file, protocol=pickle.HIGHEST_PROTOCOL)
     
     print(f"\n✅ Success! Token saved as: {token_path}")
     print(f"Verify this file is in the creds folder to be used by your main uploader script.")
 
 if __name__ == "__main__":
-    generate_token_for_account()
\ No newline at end of file
+    print("--- Google Photos Token Generator ---")
+    while True:
+        generate_token_for_account()
+        if input("\nAuthenticate another account? [y/N]: ").strip().lower() != "y":
+            break
\ No newline at end of file
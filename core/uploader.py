@@ -1,14 +1,19 @@
 import os
-import requests
 import pickle
 from tqdm import tqdm
 from google.auth.transport.requests import Request
 import infra.logger as logger
+from infra.http import session
 from infra.auth import wait_for_internet, get_storage_usage, switch_account
 from metadata.album_router import get_assigned_album, get_or_create_album
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# `rclone about` is a subprocess plus an API round trip, so storage usage is re-checked only
+# every N files or once this many bytes were uploaded since the last check
+USAGE_CHECK_EVERY_FILES = 50
+USAGE_CHECK_EVERY_BYTES = 500 * 1024 * 1024
+
 def upload_file_to_google(creds, path, album_id=None, email=None):
     wait_for_internet()
     
@@ -35,7 +40,7 @@ def upload_file_to_google(creds, path, album_id=None, email=None):
         headers['Content-Length'] = str(file_size)
         with open(path, 'rb') as f:
             with tqdm.wrapattr(f, "read", total=file_size, desc=f"Uploading {filename}", unit="B", unit_scale=True, unit_divisor=1024, miniters=1) as wrapped_file:
-                resp = requests.post('https://photoslibrary.googleapis.com/v1/uploads', data=wrapped_file, headers=headers, timeout=600)
+                resp = session.post('https://photoslibrary.googleapis.com/v1/uploads', data=wrapped_file, headers=headers, timeout=600)
         
         if resp.status_code == 200:
             upload_token = resp.text
@@ -58,7 +63,7 @@ def upload_file_to_google(creds, path, album_id=None, email=None):
                 except Exception as e:
                     logger.error(f"Failed to refresh token before batchCreate: {e}")
                 
-            create_resp = requests.post(
+            create_resp = session.post(
                 'https://photoslibrary.googleapis.com/v1/mediaItems:batchCreate',
                 headers={'Authorization': f'Bearer {creds.token}', 'Content-type': 'application/json'},
                 json=body,
@@ -82,6 +87,19 @@ def upload_file_to_google(creds, path, album_id=None, email=None):
     return False, None
 
 
+def _storage_usage(shared_state: dict) -> float:
+    """Returns the active remote's usage %, reusing the last check until it's due again."""
+    uploaded = shared_state["session_total_size"]
+    if (shared_state["storage_usage"] is None
+            or shared_state["files_since_usage_check"] >= USAGE_CHECK_EVERY_FILES
+            or uploaded - shared_state["usage_check_bytes"] >= USAGE_CHECK_EVERY_BYTES):
+        shared_state["storage_usage"] = get_storage_usage(shared_state["remote"])
+        shared_state["usage_check_bytes"] = uploaded
+        shared_state["files_since_usage_check"] = 0
+    shared_state["files_since_usage_check"] += 1
+    return shared_state["storage_usage"]
+
+
 def upload_one(item: dict, context: dict, dry_run: bool = False) -> dict | None:
     """
     Processes a single file item through the upload stage.
@@ -103,12 +121,11 @@ def upload_one(item: dict, context: dict, dry_run: bool = False) -> dict | None:
     filepath = item["filepath"]
     filesize = item["filesize"]
     email = shared_state["email"]
-    remote = shared_state["remote"]
     creds = shared_state["creds"]
     acc_idx = shared_state["acc_idx"]
 
     if not dry_run:
-        usage = get_storage_usage(remote)
+        usage = _storage_usage(shared_state)
         if usage >= 90:
             if switch_account(acc_idx, email, usage, albums_cache, device_name):
                 shared_state["should_restart"] = True
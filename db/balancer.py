@@ -1,17 +1,30 @@
 import os
 import sqlite3
 import threading
+import atexit
 import logging
 import infra.logger as lg
 import random
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 import urllib.parse
 import sys
+import weakref
+import queue
+from contextlib import contextmanager
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 
-import pg8000.dbapi
 from tqdm import tqdm
-from infra.auth import send_email as send_notification_email
+from pg8000.dbapi import convert_paramstyle
+from pg8000.converters import make_params
+from db.pool import ConnectionPool
+from db.circuit_breaker import CircuitBreaker
+from db.models import MEDIA_LIBRARY_COLUMNS
+from infra.auth import send_email_async as send_notification_email
 
 # Load env variables
 load_dotenv()
@@ -20,7 +33,136 @@ load_dotenv()
 logger = lg
 
 
-# send_notification_email is imported from infra.auth as send_notification_email
+# Rows per multi-row INSERT when copying missing rows to a lagging provider
+RECONCILE_BATCH_SIZE = 500
+
+# Smoothing factor for the per-provider read latency EWMA
+LATENCY_EWMA_ALPHA = 0.2
+
+# Post-sync check: compare full row counts instead of MAX(sl_no) (a COUNT(*) scan of the cloud table)
+VERIFY_FULL_SYNC = os.getenv("VERIFY_FULL_SYNC", "false").lower() in ("1", "true", "yes")
+
+# How long get_trips() serves its memoized copy before reloading
+TRIPS_TTL_SECS = 60
+
+# Max rows per multi-row INSERT in insert_files_bulk
+INSERT_BATCH_SIZE = 500
+
+# Cache mirrors of inserts are committed every N rows, or by a timer T seconds after the first
+# uncommitted row, instead of per call. Lookups and backups flush pending rows first, and the
+# cloud stays the source of truth if we crash.
+CACHE_COMMIT_ROWS = 64
+CACHE_COMMIT_SECS = 1.0
+
+# Rows per keyset page when pulling rows into the local cache or a lagging provider
+SYNC_PAGE_SIZE = 5000
+
+# Opt-in reconcile pass that compares per-bucket digests of media_library and fills gaps
+# below MAX(sl_no), which the max comparison alone can't see (one GROUP BY scan per provider)
+RECONCILE_DIGEST_CHECK = os.getenv("RECONCILE_DIGEST_CHECK", "false").lower() in ("1", "true", "yes")
+DIGEST_BUCKET_SIZE = 10000
+
+# Explicit select lists for reconcile/sync, so a column added to the cloud table later isn't
+# shipped over the wire (or into the cache's REPLACE) unasked. The small config tables use *.
+SELECT_COLUMNS = {
+    "media_library": ", ".join(MEDIA_LIBRARY_COLUMNS),
+}
+
+# Upsert conflict target per mirrored table
+PK_COLUMNS = {
+    "media_library": "sl_no",
+    "trips_config": "name",
+    "device_config": "device_name"
+}
+
+# Per-connection settings for every local cache connection
+SQLITE_PRAGMAS = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256MB
+    "PRAGMA cache_size=-65536",  # 64MB
+)
+
+# The cache is disposable (rebuilt from the cloud by sync_cloud_to_local), so the writer trades
+# fsync-per-commit durability for speed: WAL + synchronous=NORMAL only syncs at checkpoints
+# and lets the web UI read while the uploader writes.
+SQLITE_WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+) + SQLITE_PRAGMAS
+
+# Local cache indexes on media_library, by name (dropped and rebuilt around an initial load)
+SQLITE_MEDIA_INDEXES = {
+    "idx_filename": "CREATE INDEX IF NOT EXISTS idx_filename ON media_library(filename)",
+    "idx_filename_nocase": "CREATE INDEX IF NOT EXISTS idx_filename_nocase ON media_library(filename COLLATE NOCASE)",
+    "idx_hash": "CREATE INDEX IF NOT EXISTS idx_hash ON media_library(file_hash)",
+}
+
+# Read-only connections for local-cache lookups; under WAL they read alongside the single writer
+CACHE_READER_POOL_SIZE = 4
+
+# Max cached server-side prepared statements per pooled connection; evicted ones are deallocated
+PREPARED_CACHE_SIZE = 32
+
+# Max remembered positive file_exists_* answers per key type (rows are never deleted, so hits never go stale)
+EXISTS_CACHE_SIZE = 65536
+
+# Indexes backing the existence probes in file_exists_by_name / file_exists_by_hash. Built
+# CONCURRENTLY so the first startup doesn't block the other client's uploads on media_library.
+PG_INDEX_MIGRATIONS = {
+    "idx_media_filename_lower": "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_filename_lower ON media_library ((lower(filename)))",
+    "idx_hash": "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_hash ON media_library (file_hash)",
+}
+
+@lru_cache(maxsize=None)
+def _parse_db_url(url: str) -> dict:
+    """Parses a postgres:// URL into pg8000 connect kwargs (cached across reconnects)."""
+    if not url: return {}
+    parsed = urllib.parse.urlparse(url)
+    return {
+        "user": parsed.username,
+        "password": parsed.password,
+        "host": parsed.hostname,
+        "port": parsed.port or 5432,
+        "database": parsed.path.lstrip('/')
+    }
+
+@lru_cache(maxsize=128)
+def _upsert_sql(table_name: str, col_names: tuple, n_rows: int) -> str:
+    """Multi-row INSERT of n_rows rows that overwrites on the table's primary key."""
+    # Quoted: trips_config has an "end" column, which is a reserved word
+    cols_str = ', '.join(f'"{c}"' for c in col_names)
+    values_str = ', '.join(['(' + ', '.join(['%s'] * len(col_names)) + ')'] * n_rows)
+    sql = f"INSERT INTO {table_name} ({cols_str}) VALUES {values_str}"
+    pk_col = PK_COLUMNS.get(table_name)
+    if pk_col:
+        update_cols = [c for c in col_names if c != pk_col]
+        if update_cols:
+            update_str = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update_cols)
+            sql += f" ON CONFLICT ({pk_col}) DO UPDATE SET {update_str}"
+        else:
+            sql += f" ON CONFLICT ({pk_col}) DO NOTHING"
+    return sql
+
+def _name_variants(lower_name: str) -> list:
+    """Lookups are case-insensitive, so .jpg/.jpeg are the only variants that matter."""
+    if lower_name.endswith('.jpg'):
+        return [lower_name, lower_name[:-4] + '.jpeg']
+    if lower_name.endswith('.jpeg'):
+        return [lower_name, lower_name[:-5] + '.jpg']
+    return [lower_name]
+
+@lru_cache(maxsize=128)
+def _insert_sql(keys: tuple, n_rows: int):
+    """Builds (Postgres multi-row INSERT ... RETURNING, SQLite REPLACE) for a column set, once per shape."""
+    cols_str = ', '.join(keys)
+    row_placeholders = '(' + ', '.join(['%s'] * len(keys)) + ')'
+    values_str = ', '.join([row_placeholders] * n_rows)
+    pg_sql = f"INSERT INTO media_library ({cols_str}) VALUES {values_str} RETURNING sl_no, {cols_str}"
+    sqlite_sql = f"REPLACE INTO media_library (sl_no, {cols_str}) VALUES ({', '.join(['?'] * (len(keys) + 1))})"
+    return pg_sql, sqlite_sql
+
+# send_notification_email is infra.auth.send_email_async: queued, so failure paths don't block on SMTP
 
 class DatabaseBalancer:
     def __init__(self, use_local_cache=False):
@@ -31,32 +173,85 @@ class DatabaseBalancer:
         if not self.nhost_url or not self.neon_url:
             logger.warning("Missing NHOST_DB_URL or NEON_DB_URL in .env. Attempting to run with missing DB providers.")
 
-        self.provider_a_active = False
-        self.provider_b_active = False
+        # Per-provider pools of warm connections; see db/pool.py
+        self.pool_size = int(os.getenv("DB_POOL_SIZE", "4"))
+        self.pool_a = None
+        self.pool_b = None
+
+        # Backoff for transient connection errors (see _retry)
+        self.retry_attempts = int(os.getenv("DB_RETRY_ATTEMPTS", "4"))
+        self.retry_base = float(os.getenv("DB_RETRY_BASE", "0.05"))
+        self.retry_max_wait = float(os.getenv("DB_RETRY_MAX_WAIT", "2.0"))
 
-        self.conn_a = None
-        self.conn_b = None
+        # Per-provider circuit breakers; an OPEN breaker skips that provider without a socket attempt
+        self.cb_a = CircuitBreaker("Nhost (A)", is_connection_error=self._is_connection_error)
+        self.cb_b = CircuitBreaker("Neon (B)", is_connection_error=self._is_connection_error)
+        # Per-provider read latency (seconds, EWMA) used to weight read routing
+        self.latency_ewma = {'A': 0.05, 'B': 0.05}
+        # Reads currently outstanding per provider (power-of-two-choices routing)
+        self._inflight = {'A': 0, 'B': 0}
+        self._inflight_lock = threading.Lock()
+        # Serialises pool rebuilds per provider, so threads hitting the same dead socket rebuild once
+        self._reconnect_locks = {'A': threading.Lock(), 'B': threading.Lock()}
+        # Providers that missed mirrored writes while their breaker was open. Writes skip them
+        # until the heal thread has copied the gap over (see _heal_provider).
+        self._needs_reconcile = set()
+        self._heal_thread = None
+        # Mirrored writes in flight; the heal thread closes the gate and drains them for its final pass
+        self._write_gate = threading.Condition()
+        self._writes_inflight = 0
+        self._gate_closed = False
+        # Runs the A and B legs of a mirrored write in parallel; each leg checks out its own pooled connection
+        self._write_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="db-mirror")
+        # conn -> LRU {sql: (statement name, columns, input funcs)}; entries vanish with their connection
+        self._prepared = weakref.WeakKeyDictionary()
+        self._prepared_lock = threading.Lock()
+        # conn -> its one long-lived cursor, reused across checkouts instead of conn.cursor() per query
+        self._cursors = weakref.WeakKeyDictionary()
+        self._cursors_lock = threading.Lock()
+
+        # (provider, table) -> serial sequence name; static for the life of the schema
+        self._seq_names = {}
+        # (provider, table) -> MAX(sl_no) at our last setval, so a repeat reconcile skips it
+        self._synced_max = {}
 
         self._sqlite_lock = threading.Lock()  # Protects all SQLite operations across threads
+        # Inserted rows on the cache writer not yet committed (see CACHE_COMMIT_ROWS)
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+        self._flush_timer = None  # commits the tail of a burst once inserts go quiet
 
         self._connect_providers()
 
         self.cache_conn = None
         self.cache_cursor = None
+        # LIFO pool of read-only (conn, cursor) pairs for lookups, so probes don't queue behind
+        # cache writes or each other; empty until init_local_cache opens the cache from disk
+        self._reader_conns = []
+        self._readers = queue.LifoQueue()
+        # Exact in-memory key sets over the local cache (see _local_index); None until first use
+        self._name_index = None
+        self._hash_index = None
+        # Set once sync_cloud_to_local verifies the cache against the cloud; from then on a
+        # local miss in get_file_by_hash is final (our own inserts are mirrored into the cache)
+        self._cache_synced = False
+        # LRU of lowercased names / hashes known to exist, checked before any query
+        self._name_hits = OrderedDict()
+        self._hash_hits = OrderedDict()
+        self._hits_lock = threading.Lock()
+        # Memoized get_trips() result; trips change rarely (see TRIPS_TTL_SECS)
+        self._trips_cache = None
+        self._trips_cache_ts = 0.0
+        self._trips_lock = threading.Lock()
         if use_local_cache:
             self.init_local_cache()
             self.reconcile_databases()
+        # main.py never closes the manager explicitly; close() is idempotent
+        atexit.register(self.close)
 
     def _parse_url(self, url: str):
-        if not url: return {}
-        parsed = urllib.parse.urlparse(url)
-        return {
-            "user": parsed.username,
-            "password": parsed.password,
-            "host": parsed.hostname,
-            "port": parsed.port or 5432,
-            "database": parsed.path.lstrip('/')
-        }
+        # Copy: callers add connect options to the dict
+        return dict(_parse_db_url(url))
 
     def _is_connection_error(self, e: Exception) -> bool:
         err_str = str(e).lower()
@@ -66,52 +261,110 @@ class DatabaseBalancer:
         if "broken pipe" in err_str: return True
         if "connection reset" in err_str: return True
         if "connection aborted" in err_str: return True
+        if "can't create a connection" in err_str: return True  # pg8000 InterfaceError when the host is down
         if "interfaceerror" in err_str: return True
         if "closed" in err_str: return True
         if isinstance(e, (ConnectionError, OSError)): return True
         return False
 
-    def _reconnect_provider(self, provider_id: str):
-        if provider_id == 'A' and self.nhost_url:
-            try:
-                kwargs_a = self._parse_url(self.nhost_url)
-                kwargs_a['tcp_keepalive'] = True
-                self.conn_a = pg8000.dbapi.connect(**kwargs_a)
-                self.conn_a.autocommit = True
-                self.provider_a_active = True
-                logger.info("✅ Connected to Nhost (Provider A).")
-                return True
-            except Exception as e:
-                self.provider_a_active = False
-                logger.error(f"❌ Nhost Connection/Reconnect Failed: {e}")
-                return False
-        elif provider_id == 'B' and self.neon_url:
+    def _new_pool(self, url: str) -> ConnectionPool:
+        """Builds a pool for a provider and opens one connection up front to verify it."""
+        kwargs = self._parse_url(url)
+        kwargs['tcp_keepalive'] = True
+        pool = ConnectionPool(kwargs, size=self.pool_size, is_connection_error=self._is_connection_error)
+        pool.put(pool.get())
+        return pool
+
+    def _pool(self, provider_id: str) -> ConnectionPool:
+        return self.pool_a if provider_id == 'A' else self.pool_b
+
+    def _breaker(self, provider_id: str) -> CircuitBreaker:
+        return self.cb_a if provider_id == 'A' else self.cb_b
+
+    @property
+    def provider_a_active(self) -> bool:
+        return self.pool_a is not None and self.cb_a.state != CircuitBreaker.OPEN
+
+    @property
+    def provider_b_active(self) -> bool:
+        return self.pool_b is not None and self.cb_b.state != CircuitBreaker.OPEN
+
+    def acquire(self, provider_id: str):
+        """Context manager yielding a pooled connection to provider 'A' or 'B'."""
+        pool = self._pool(provider_id)
+        if pool is None and self._reconnect_provider(provider_id):
+            pool = self._pool(provider_id)
+        if pool is None:
+            raise ConnectionError(f"Provider {provider_id} is not connected")
+        return pool.connection()
+
+    def _reconnect_provider(self, provider_id: str, stale: ConnectionPool = None):
+        """(Re)creates a provider's pool if it is still `stale` (None: not connected yet).
+
+        Threads that saw the same dead pool queue on a per-provider lock; once one has
+        rebuilt it the rest find a different pool and reuse it. The old pool is closed,
+        and connections still checked out from it are closed when they're returned.
+        """
+        url, name = (self.nhost_url, "Nhost") if provider_id == 'A' else (self.neon_url, "Neon")
+        if not url:
+            return False
+        with self._reconnect_locks[provider_id]:
+            old_pool = self._pool(provider_id)
+            if old_pool is not stale:
+                return old_pool is not None  # another thread already rebuilt it
             try:
-                kwargs_b = self._parse_url(self.neon_url)
-                kwargs_b['tcp_keepalive'] = True
-                self.conn_b = pg8000.dbapi.connect(**kwargs_b)
-                self.conn_b.autocommit = True
-                self.provider_b_active = True
-                logger.info("✅ Connected to Neon (Provider B).")
-                return True
+                new_pool = self._new_pool(url)
             except Exception as e:
-                self.provider_b_active = False
-                logger.error(f"❌ Neon Connection/Reconnect Failed: {e}")
+                logger.error(f"❌ {name} Connection/Reconnect Failed: {e}")
                 return False
-        return False
+            if provider_id == 'A':
+                self.pool_a = new_pool
+            else:
+                self.pool_b = new_pool
+        if old_pool: old_pool.close_all()
+        logger.info(f"✅ Connected to {name} (Provider {provider_id}).")
+        return True
 
     def _connect_providers(self):
-        if self.nhost_url:
-            if not self._reconnect_provider('A'):
-                self._handle_single_failure("Nhost (A)", "Initial connection failed")
-                
-        if self.neon_url:
-            if not self._reconnect_provider('B'):
-                self._handle_single_failure("Neon (B)", "Initial connection failed")
+        for provider_id, url in (('A', self.nhost_url), ('B', self.neon_url)):
+            breaker = self._breaker(provider_id)
+            if not url:
+                breaker.disable()
+            elif not self._reconnect_provider(provider_id):
+                breaker.trip()
+                # Its sequence lags whatever the other provider accepts meanwhile; only rejoin via _heal_provider
+                self._needs_reconcile.add(provider_id)
+                self._handle_single_failure(breaker.name, "Initial connection failed")
+            else:
+                self._migrate_indexes(provider_id)
                 
         if not self.provider_a_active and not self.provider_b_active:
             self._handle_total_failure()
             
+    def _migrate_indexes(self, provider_id: str):
+        """One-shot, idempotent index migrations run on each provider at startup.
+
+        Only missing or invalid indexes are touched, so a normal startup is one catalog
+        query. Pooled connections are autocommit, which CREATE INDEX CONCURRENTLY requires;
+        an interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would
+        skip forever, so that one is dropped and rebuilt.
+        """
+        try:
+            with self.acquire(provider_id) as conn:
+                cursor = self._cursor(conn)
+                cursor.execute(
+                    "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = ANY(%s)", (list(PG_INDEX_MIGRATIONS),))
+                valid = dict(cursor.fetchall())
+                for index_name, create_index in PG_INDEX_MIGRATIONS.items():
+                    if valid.get(index_name):
+                        continue
+                    if index_name in valid:
+                        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+                    cursor.execute(create_index)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not apply index migrations on {self._breaker(provider_id).name}: {e}")
+
     def _handle_single_failure(self, provider_name: str, error_msg: str):
         subject = f"Urgent: Provider {provider_name} Down"
         body = f"Provider {provider_name} failed to connect or operate.\n\nError:\n{error_msg}\n\nSwitching to Degraded Mode."
@@ -133,166 +386,399 @@ class DatabaseBalancer:
         send_notification_email(subject, body)
         sys.exit(1)
 
-    def execute_query(self, sql: str, params=None, is_write=False, fetch_one=False, fetch_all=False):
-        """Standardized query execution with try/except failover for Dual-Cloud."""
+    def _retry(self, fn, provider_id: str):
+        """Calls fn(), retrying connection errors with capped exponential backoff and full jitter.
+
+        Query errors are raised immediately; retries stop once the next sleep would pass
+        the DB_RETRY_MAX_WAIT deadline so callers still fail fast.
+        """
+        deadline = time.monotonic() + self.retry_max_wait
+        for attempt in range(self.retry_attempts):
+            pool = self._pool(provider_id)
+            try:
+                return fn()
+            except Exception as e:
+                if not self._is_connection_error(e) or attempt == self.retry_attempts - 1:
+                    raise
+                delay = random.uniform(0, self.retry_base * 2 ** attempt)
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(f"Provider {provider_id} connection error: {e}. Retrying in {delay:.3f}s (attempt {attempt + 1}/{self.retry_attempts})...")
+                if attempt == 0:
+                    # Idle sockets are likely dead too (e.g. server restart); start from a fresh pool
+                    self._reconnect_provider(provider_id, stale=pool)
+                time.sleep(delay)
+
+    def _cursor(self, conn):
+        """Returns the cursor owned by a pooled connection; it dies with the connection when discarded."""
+        with self._cursors_lock:
+            cursor = self._cursors.get(conn)
+            if cursor is None:
+                cursor = self._cursors[conn] = conn.cursor()
+            return cursor
+
+    def _execute_prepared(self, conn, sql: str, params):
+        """Runs sql as a named server-side prepared statement, cached per pooled connection.
+
+        cursor.execute() sends an unnamed Parse, Describe and Bind/Execute with a sync after
+        each (three round-trips, plus a fresh parse/plan); a cached statement is one Bind/Execute.
+        """
+        with self._prepared_lock:
+            stmts = self._prepared.setdefault(conn, OrderedDict())
+        statement, vals = convert_paramstyle("format", sql, params)
+        entry = stmts.get(sql)
+        if entry is None:
+            entry = stmts[sql] = conn.prepare_statement(statement, ())
+            if len(stmts) > PREPARED_CACHE_SIZE:
+                _, (oldest, _, _) = stmts.popitem(last=False)
+                self._close_prepared(conn, oldest)
+        else:
+            stmts.move_to_end(sql)
+        name_bin, columns, input_funcs = entry
+        try:
+            context = conn.execute_named(name_bin, make_params(conn.py_types, vals), columns, input_funcs, statement)
+        except Exception:
+            # Re-prepare next time, e.g. after "cached plan must not change result type"
+            stmts.pop(sql, None)
+            self._close_prepared(conn, name_bin)
+            raise
+        return context.rows
+
+    def _close_prepared(self, conn, name_bin):
+        """Deallocates a server-side statement; a dead connection takes its statements with it."""
+        try:
+            conn.close_prepared_statement(name_bin)
+        except Exception:
+            pass
+
+    def _run_on(self, provider_id: str, sql: str, params, fetch_one: bool, fetch_all: bool, prepared: bool = False):
+        """Runs one statement on a provider, retrying dropped connections."""
+        def op():
+            with self.acquire(provider_id) as conn:
+                if prepared:
+                    rows = self._execute_prepared(conn, sql, params)
+                    if fetch_one: return rows[0] if rows else None
+                    if fetch_all: return rows
+                    return None
+                cursor = self._cursor(conn)
+                cursor.execute(sql, params)
+                if fetch_one: return cursor.fetchone()
+                if fetch_all: return cursor.fetchall()
+                return None
+        return self._retry(op, provider_id)
+
+    def _record_failure(self, provider_id: str, e: Exception):
+        breaker = self._breaker(provider_id)
+        if breaker.record_failure(e):
+            logger.error(f"🔌 Circuit breaker OPEN for {breaker.name} after {breaker.failures} consecutive failures.")
+            self._handle_single_failure(breaker.name, str(e))
+
+    def _record_success(self, provider_id: str):
+        breaker = self._breaker(provider_id)
+        if breaker.record_success():
+            logger.info(f"✅ Circuit breaker CLOSED for {breaker.name}; provider recovered.")
+
+    def _schedule_heal(self):
+        """Starts the heal thread for a provider that missed writes, once its breaker lets a probe through."""
+        if self._heal_thread is not None and self._heal_thread.is_alive():
+            return
+        for provider_id in list(self._needs_reconcile):
+            if self._breaker(provider_id).allow():
+                self._heal_thread = threading.Thread(target=self._heal_provider, args=(provider_id,),
+                                                     name=f"db-heal-{provider_id}", daemon=True)
+                self._heal_thread.start()
+                return
+
+    def _heal_provider(self, provider_id: str):
+        """Copies writes a provider missed while its breaker was open; runs on its own thread.
+
+        The bulk copy runs while writes keep going to the healthy provider alone. Then the
+        write gate is closed, in-flight writes drain, and a second (small) pass catches what
+        landed meanwhile before the provider rejoins mirrored writes.
+        """
+        name = self._breaker(provider_id).name
+        logger.info(f"🩹 {name} missed mirrored writes; reconciling in the background.")
+        # A provider that failed its initial connect has no pool yet
+        ok = self._pool(provider_id) is not None or self._reconnect_provider(provider_id)
+        ok = ok and self.reconcile_databases()
+        if ok:
+            with self._write_gate:
+                self._gate_closed = True
+                while self._writes_inflight:
+                    self._write_gate.wait()
+            try:
+                ok = self.reconcile_databases()
+                if ok:
+                    self._needs_reconcile.discard(provider_id)
+            finally:
+                with self._write_gate:
+                    self._gate_closed = False
+                    self._write_gate.notify_all()
+        if ok:
+            self._record_success(provider_id)
+            logger.info(f"✅ {name} caught up; mirrored writes resume.")
+        else:
+            self._record_failure(provider_id, ConnectionError("Reconciliation after outage failed"))
+
+    def _observe_latency(self, provider_id: str, elapsed: float):
+        self.latency_ewma[provider_id] = (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma[provider_id] + LATENCY_EWMA_ALPHA * elapsed
+
+    def _read_order(self) -> list:
+        """Providers to try for a read: least-loaded first, ties broken by latency/health weights; the other is the fallback.
+
+        A provider still missing mirrored writes is left out until _heal_provider catches it up;
+        its stale answers would make file_exists/hash checks miss files that were uploaded.
+        """
+        options, weights = [], []
+        for pid in ('A', 'B'):
+            breaker = self._breaker(pid)
+            if pid in self._needs_reconcile or not breaker.available():
+                continue
+            weight = 1 / max(self.latency_ewma[pid], 1e-3)
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                weight *= 0.2  # only a trickle of probes until it has proven itself
+            options.append(pid)
+            weights.append(weight)
+        if len(options) < 2:
+            return options
+        a, b = options
+        both_closed = self.cb_a.state == self.cb_b.state == CircuitBreaker.CLOSED
+        if both_closed and self._inflight[a] != self._inflight[b]:
+            # Power of two choices: with two providers, just take the one with fewer reads in flight
+            first = min(options, key=self._inflight.__getitem__)
+        else:
+            first = random.choices(options, weights=weights, k=1)[0]
+        return [first] + [pid for pid in options if pid != first]
+
+    def execute_query(self, sql: str, params=None, is_write=False, fetch_one=False, fetch_all=False, prepared=False):
+        """Standardized query execution with try/except failover for Dual-Cloud.
+
+        prepared=True runs the statement as a cached server-side prepared statement; use it
+        for the fixed-text hot queries (existence checks, insert_file).
+        """
         params = params or ()
         
         if is_write:
-            success_a = False
-            success_b = False
-            res_a = None
-            res_b = None
+            results = {}
+            query_error = None
             
-            if self.provider_a_active:
-                for attempt in range(2):
-                    try:
-                        cursor_a = self.conn_a.cursor()
-                        cursor_a.execute(sql, params)
-                        success_a = True
-                        if fetch_one: res_a = cursor_a.fetchone()
-                        elif fetch_all: res_a = cursor_a.fetchall()
-                        break
-                    except Exception as e:
-                        if attempt == 0 and self._is_connection_error(e):
-                            logger.warning(f"Provider A connection error: {e}. Attempting reconnect...")
-                            if self._reconnect_provider('A'):
-                                continue
-                        logger.error(f"Provider A Write Failed: {e}")
-                        self.provider_a_active = False
-                        self._handle_single_failure("Nhost (A)", str(e))
-                        break
-                    
-            if self.provider_b_active:
-                for attempt in range(2):
+            with self._write_gate:
+                while self._gate_closed:
+                    self._write_gate.wait()
+                self._writes_inflight += 1
+            try:
+                # Both legs run concurrently, so a mirrored write costs max(latency_A, latency_B).
+                # A provider still missing writes sits out until the heal thread has caught it up.
+                futures = {}
+                for provider_id in ('A', 'B'):
+                    if provider_id in self._needs_reconcile:
+                        continue
+                    if self._breaker(provider_id).allow():
+                        futures[provider_id] = self._write_pool.submit(self._run_on, provider_id, sql, params, fetch_one, fetch_all, prepared)
+                    else:
+                        self._needs_reconcile.add(provider_id)
+
+                for provider_id, future in futures.items():
                     try:
-                        cursor_b = self.conn_b.cursor()
-                        cursor_b.execute(sql, params)
-                        success_b = True
-                        if fetch_one: res_b = cursor_b.fetchone()
-                        elif fetch_all: res_b = cursor_b.fetchall()
-                        break
+                        results[provider_id] = future.result()
+                        self._record_success(provider_id)
                     except Exception as e:
-                        if attempt == 0 and self._is_connection_error(e):
-                            logger.warning(f"Provider B connection error: {e}. Attempting reconnect...")
-                            if self._reconnect_provider('B'):
-                                continue
-                        logger.error(f"Provider B Write Failed: {e}")
-                        self.provider_b_active = False
-                        self._handle_single_failure("Neon (B)", str(e))
-                        break
-                    
+                        logger.error(f"Provider {provider_id} Write Failed: {e}")
+                        self._record_failure(provider_id, e)
+                        if self._is_connection_error(e):
+                            self._needs_reconcile.add(provider_id)
+                        else:
+                            query_error = e
+            finally:
+                with self._write_gate:
+                    self._writes_inflight -= 1
+                    self._write_gate.notify_all()
+
+            if self._needs_reconcile:
+                self._schedule_heal()
+
             if not self.provider_a_active and not self.provider_b_active:
                 self._handle_total_failure()
                 
-            if (self.provider_a_active and not success_a) or (self.provider_b_active and not success_b):
+            if query_error is not None or not results:
                 raise Exception("Synchronous mirrored write failed on an active provider!")
                 
-            return res_a if success_a else res_b
+            return results['A'] if 'A' in results else results['B']
             
         else:
-            # Round-Robin / Random Read Select
-            for attempt in range(2):
-                options = []
-                if self.provider_a_active: options.append(('A', self.conn_a))
-                if self.provider_b_active: options.append(('B', self.conn_b))
-                
-                if not options:
-                    self._handle_total_failure()
-                    
-                provider_id, conn = random.choice(options)
+            last_error = None
+            
+            for provider_id in self._read_order():
+                if not self._breaker(provider_id).allow():
+                    continue
+                with self._inflight_lock:
+                    self._inflight[provider_id] += 1
                 try:
-                    cursor = conn.cursor()
-                    cursor.execute(sql, params)
-                    if fetch_one: return cursor.fetchone()
-                    if fetch_all: return cursor.fetchall()
-                    return None
+                    started = time.perf_counter()
+                    res = self._run_on(provider_id, sql, params, fetch_one, fetch_all, prepared)
+                    self._observe_latency(provider_id, time.perf_counter() - started)
+                    self._record_success(provider_id)
+                    return res
                 except Exception as e:
-                    if attempt == 0 and self._is_connection_error(e):
-                        logger.warning(f"Provider {provider_id} connection error: {e}. Attempting reconnect...")
-                        if self._reconnect_provider(provider_id):
-                            continue
-
                     logger.error(f"Provider {provider_id} Read Failed: {e}")
-                    if provider_id == 'A':
-                        self.provider_a_active = False
-                        self._handle_single_failure("Nhost (A)", str(e))
-                    else:
-                        self.provider_b_active = False
-                        self._handle_single_failure("Neon (B)", str(e))
+                    self._record_failure(provider_id, e)
+                    if not self._is_connection_error(e):
+                        raise
+                    last_error = e
+                    # Fall through to the other provider
+                finally:
+                    with self._inflight_lock:
+                        self._inflight[provider_id] -= 1
                     
-                    # Retry on the remaining active provider immediately
-                    return self.execute_query(sql, params, is_write=False, fetch_one=fetch_one, fetch_all=fetch_all)
+            if not self.provider_a_active and not self.provider_b_active:
+                self._handle_total_failure()
+            raise ConnectionError(f"No database provider available for read: {last_error}")
+
+    def _sequence_name(self, cursor, provider_id: str, table_name: str) -> str:
+        """Serial sequence behind table_name.sl_no; looked up once per provider and table."""
+        key = (provider_id, table_name)
+        if key not in self._seq_names:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'sl_no')", (table_name,))
+            res = cursor.fetchone()
+            self._seq_names[key] = res[0] if res and res[0] else f"{table_name}_sl_no_seq"
+        return self._seq_names[key]
 
     def _sync_sequences(self):
         """Ensures the auto-increment sequences are up to date with the max sl_no."""
-        for active, conn, name in [(self.provider_a_active, self.conn_a, "Nhost (A)"), 
-                                   (self.provider_b_active, self.conn_b, "Neon (B)")]:
+        for active, provider_id, name in [(self.provider_a_active, 'A', "Nhost (A)"), 
+                                          (self.provider_b_active, 'B', "Neon (B)")]:
             if active:
                 try:
-                    cursor = conn.cursor()
-                    
-                    # Sync media_library sequence
-                    cursor.execute("SELECT COALESCE(MAX(sl_no), 1) FROM media_library")
-                    max_val_media = cursor.fetchone()[0]
-                    cursor.execute("SELECT pg_get_serial_sequence('media_library', 'sl_no')")
-                    seq_res_media = cursor.fetchone()
-                    seq_name_media = seq_res_media[0] if seq_res_media and seq_res_media[0] else 'media_library_sl_no_seq'
-                    cursor.execute("SELECT setval(%s, %s)", (seq_name_media, max_val_media))
-                    
-                    # Sync trips_config sequence
-                    cursor.execute("SELECT COALESCE(MAX(sl_no), 1) FROM trips_config")
-                    max_val_trips = cursor.fetchone()[0]
-                    cursor.execute("SELECT pg_get_serial_sequence('trips_config', 'sl_no')")
-                    seq_res_trips = cursor.fetchone()
-                    seq_name_trips = seq_res_trips[0] if seq_res_trips and seq_res_trips[0] else 'trips_config_sl_no_seq'
-                    cursor.execute("SELECT setval(%s, %s)", (seq_name_trips, max_val_trips))
+                    with self.acquire(provider_id) as conn:
+                        cursor = self._cursor(conn)
+                        for table_name in ("media_library", "trips_config"):
+                            cursor.execute(f"SELECT COALESCE(MAX(sl_no), 1) FROM {table_name}")
+                            max_val = cursor.fetchone()[0]
+                            # Unchanged max since our last setval: the sequence can only have moved forward
+                            if self._synced_max.get((provider_id, table_name)) == max_val:
+                                continue
+                            seq_name = self._sequence_name(cursor, provider_id, table_name)
+                            cursor.execute("SELECT setval(%s, %s)", (seq_name, max_val))
+                            self._synced_max[(provider_id, table_name)] = max_val
                     
                     logger.debug(f"Synced sequences on {name}")
                 except Exception as e:
                     logger.warning(f"⚠️ Could not sync sequences on {name}: {e}")
 
-    def _reconcile_table(self, table_name: str, cache_table_name_for_sqlite: str = None):
-        """Helper to reconcile a specific table using MAX(sl_no)."""
+    def _copy_rows(self, cursor, table_name: str, col_names: tuple, rows: list, cache_table: str = None):
+        """Upserts rows through `cursor` in RECONCILE_BATCH_SIZE multi-row INSERTs (one round-trip per
+        batch) and mirrors them into the local cache. The caller commits the SQLite side."""
+        for i in range(0, len(rows), RECONCILE_BATCH_SIZE):
+            batch = rows[i:i + RECONCILE_BATCH_SIZE]
+            cursor.execute(_upsert_sql(table_name, col_names, len(batch)), tuple(chain.from_iterable(batch)))
+
+        if self.cache_cursor:
+            cols_str = ', '.join(f'"{c}"' for c in col_names)
+            placeholders = ', '.join(['?'] * len(col_names))
+            with self._sqlite_lock:
+                self.cache_cursor.executemany(f"REPLACE INTO {cache_table or table_name} ({cols_str}) VALUES ({placeholders})", rows)
+
+    def _bucket_digests(self, provider_id: str) -> dict:
+        """Returns {bucket: md5 of its (sl_no, file_hash) pairs} for media_library on one provider."""
+        with self.acquire(provider_id) as conn:
+            cursor = self._cursor(conn)
+            cursor.execute(
+                "SELECT sl_no / %s AS bucket, md5(string_agg(sl_no::text || ':' || COALESCE(file_hash, ''), ',' ORDER BY sl_no)) "
+                "FROM media_library GROUP BY bucket",
+                (DIGEST_BUCKET_SIZE,)
+            )
+            return dict(cursor.fetchall())
+
+    def _reconcile_buckets(self) -> bool:
+        """Deep check for media_library: copies rows missing on either side within buckets whose digests differ."""
+        try:
+            digests_a = self._bucket_digests('A')
+            digests_b = self._bucket_digests('B')
+        except Exception as e:
+            logger.error(f"❌ Failed to compute media_library digests: {e}")
+            return False
+
+        buckets = sorted(b for b in digests_a.keys() | digests_b.keys() if digests_a.get(b) != digests_b.get(b))
+        if not buckets:
+            logger.info(f"✅ media_library - All {len(digests_a)} digest buckets match.")
+            return True
+
+        logger.warning(f"⚠️ media_library - {len(buckets)} digest bucket(s) differ between Nhost(A) and Neon(B). Healing...")
+        copied = 0
+        try:
+            with self.acquire('A') as conn_a, self.acquire('B') as conn_b:
+                cursors = {'A': self._cursor(conn_a), 'B': self._cursor(conn_b)}
+                for bucket in buckets:
+                    lo = bucket * DIGEST_BUCKET_SIZE
+                    rows, col_names = {}, {}
+                    for pid, cursor in cursors.items():
+                        cursor.execute(f"SELECT {SELECT_COLUMNS['media_library']} FROM media_library WHERE sl_no >= %s AND sl_no < %s", (lo, lo + DIGEST_BUCKET_SIZE))
+                        col_names[pid] = tuple(desc[0] for desc in cursor.description)
+                        sl_no_idx = col_names[pid].index('sl_no')
+                        rows[pid] = {r[sl_no_idx]: r for r in cursor.fetchall()}
+
+                    # Only fill gaps; a row present on both sides with different content is left alone
+                    for src, dst in (('A', 'B'), ('B', 'A')):
+                        missing = [r for sl_no, r in rows[src].items() if sl_no not in rows[dst]]
+                        if missing:
+                            self._copy_rows(cursors[dst], "media_library", col_names[src], missing)
+                            copied += len(missing)
+        except Exception as e:
+            logger.error(f"❌ Failed to heal media_library buckets: {e}")
+            return False
+        finally:
+            if self.cache_cursor and copied:
+                with self._sqlite_lock:
+                    self.cache_conn.commit()
+                    self._name_index = self._hash_index = None
+
+        logger.info(f"✅ media_library - Filled {copied} missing row(s) across {len(buckets)} bucket(s).")
+        return True
+
+    def _reconcile_table(self, table_name: str, cache_table_name_for_sqlite: str = None) -> bool:
+        """Helper to reconcile a specific table using MAX(sl_no). Returns False if the sync failed."""
         if not cache_table_name_for_sqlite:
             cache_table_name_for_sqlite = table_name
 
         max_a = 0
         max_b = 0
 
-        if self.provider_a_active and self.conn_a:
+        if self.provider_a_active:
             try:
-                cursor_a = self.conn_a.cursor()
-                cursor_a.execute(f"SELECT MAX(sl_no) FROM {table_name}")
-                res_a = cursor_a.fetchone()
+                with self.acquire('A') as conn_a:
+                    cursor_a = self._cursor(conn_a)
+                    cursor_a.execute(f"SELECT MAX(sl_no) FROM {table_name}")
+                    res_a = cursor_a.fetchone()
                 if res_a and res_a[0]: max_a = res_a[0]
             except Exception as e:
                 logger.error(f"Failed to query Max SL_NO from A for {table_name}: {e}")
 
-        if self.provider_b_active and self.conn_b:
+        if self.provider_b_active:
             try:
-                cursor_b = self.conn_b.cursor()
-                cursor_b.execute(f"SELECT MAX(sl_no) FROM {table_name}")
-                res_b = cursor_b.fetchone()
+                with self.acquire('B') as conn_b:
+                    cursor_b = self._cursor(conn_b)
+                    cursor_b.execute(f"SELECT MAX(sl_no) FROM {table_name}")
+                    res_b = cursor_b.fetchone()
                 if res_b and res_b[0]: max_b = res_b[0]
             except Exception as e:
                 logger.error(f"Failed to query Max SL_NO from B for {table_name}: {e}")
         
         if max_a == max_b:
             logger.info(f"✅ {table_name} - Both providers in sync (Max sl_no: {max_a}).")
-            return
+            return True
             
         logger.warning(f"⚠️ {table_name} - Mismatch detected! Nhost(A): {max_a}, Neon(B): {max_b}")
         
         if max_a > max_b:
-            leading_conn = self.conn_a
-            lagging_conn = self.conn_b
+            leading_id = 'A'
+            lagging_id = 'B'
             leading_name = "Nhost(A)"
             lagging_name = "Neon(B)"
             leading_max = max_a
             lagging_max = max_b
         else:
-            leading_conn = self.conn_b
-            lagging_conn = self.conn_a
+            leading_id = 'B'
+            lagging_id = 'A'
             leading_name = "Neon(B)"
             lagging_name = "Nhost(A)"
             leading_max = max_b
@@ -301,67 +787,78 @@ class DatabaseBalancer:
         logger.info(f"{table_name} - Leader is {leading_name}, Lagger is {lagging_name}. Fetching missing rows...")
         
         try:
-            cursor_lead = leading_conn.cursor()
-            cursor_lead.execute(f"SELECT * FROM {table_name} WHERE sl_no > %s ORDER BY sl_no ASC", (lagging_max,))
-            missing_rows = cursor_lead.fetchall()
-            
-            if not missing_rows:
-                return
-                
-            col_names = [desc[0] for desc in cursor_lead.description]
-            cursor_lag = lagging_conn.cursor()
-            placeholders = ', '.join(['%s'] * len(col_names))
-            cols_str = ', '.join(col_names)
-            
-            pk_map = {
-                "media_library": "sl_no",
-                "trips_config": "name",
-                "device_config": "device_name"
-            }
-            pk_col = pk_map.get(table_name)
-            
-            if pk_col:
-                update_cols = [c for c in col_names if c != pk_col]
-                if update_cols:
-                    update_str = ", ".join([f'{c} = EXCLUDED."{c}"' if c == "end" else f"{c} = EXCLUDED.{c}" for c in update_cols])
-                    insert_sql = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders}) ON CONFLICT ({pk_col}) DO UPDATE SET {update_str}"
-                else:
-                    insert_sql = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders}) ON CONFLICT ({pk_col}) DO NOTHING"
-            else:
-                insert_sql = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders})"
-            
-            for row in tqdm(missing_rows, desc=f"Syncing {table_name} to {lagging_name}", unit="rows"):
-                cursor_lag.execute(insert_sql, row)
-                
-            if self.cache_cursor:
-                    sqlite_placeholders = ', '.join(['?'] * len(col_names))
-                    sqlite_insert = f"REPLACE INTO {cache_table_name_for_sqlite} ({cols_str}) VALUES ({sqlite_placeholders})"
+            with self.acquire(leading_id) as leading_conn, self.acquire(lagging_id) as lagging_conn:
+                cursor_lead = self._cursor(leading_conn)
+                cursor_lag = self._cursor(lagging_conn)
+                select_list = SELECT_COLUMNS.get(table_name, "*")
+                col_names = None
+                last_sl_no = lagging_max
+                copied = 0
+
+                # Missing rows are pulled in keyset pages (pg8000 buffers a whole result set client-side,
+                # so one SELECT * would hold the entire gap in memory). The lagging side still takes them
+                # in one transaction; each batch is a single multi-row INSERT, one round-trip per batch.
+                lagging_conn.autocommit = False
+                try:
+                    with tqdm(desc=f"Syncing {table_name} to {lagging_name}", unit="rows") as pbar:
+                        while True:
+                            cursor_lead.execute(f"SELECT {select_list} FROM {table_name} WHERE sl_no > %s ORDER BY sl_no ASC LIMIT {SYNC_PAGE_SIZE}", (last_sl_no,))
+                            page = cursor_lead.fetchall()
+                            if not page:
+                                break
+
+                            if col_names is None:
+                                col_names = tuple(desc[0] for desc in cursor_lead.description)
+                                sl_no_idx = col_names.index('sl_no')
+
+                            self._copy_rows(cursor_lag, table_name, col_names, page, cache_table_name_for_sqlite)
+
+                            copied += len(page)
+                            pbar.update(len(page))
+                            last_sl_no = page[-1][sl_no_idx]
+                            if len(page) < SYNC_PAGE_SIZE:
+                                break
+                    lagging_conn.commit()
+                except Exception:
+                    lagging_conn.rollback()
+                    raise
+                finally:
+                    lagging_conn.autocommit = True
+
+                if not copied:
+                    return True
+
+                if self.cache_cursor:
                     with self._sqlite_lock:
-                        for row in tqdm(missing_rows, desc=f"Syncing {table_name} to local cache", unit="rows"):
-                            self.cache_cursor.execute(sqlite_insert, row)
                         self.cache_conn.commit()
+                        self._name_index = self._hash_index = None
                 
-            subject = f"Recovery Successful - {table_name}"
-            body = f"Reconciled {table_name} databases.\nIdentified {lagging_name} as lagging by {len(missing_rows)} rows.\nSynced rows successfully to {lagging_name} and local cache."
-            logger.info(f"✅ {body}")
-            send_notification_email(subject, body)
+                subject = f"Recovery Successful - {table_name}"
+                body = f"Reconciled {table_name} databases.\nIdentified {lagging_name} as lagging by {copied} rows.\nSynced rows successfully to {lagging_name} and local cache."
+                logger.info(f"✅ {body}")
+                send_notification_email(subject, body)
+                return True
             
         except Exception as e:
             logger.error(f"❌ Failed to reconcile {table_name} databases: {e}")
+            return False
 
-    def reconcile_databases(self):
-        """Self-Heal Phase: Reconciles databases using max(sl_no)."""
+    def reconcile_databases(self) -> bool:
+        """Self-Heal Phase: Reconciles databases using max(sl_no). Returns True if both providers are in sync."""
         logger.info("🔍 Running Initialization & Auto-Reconciliation...")
         if not self.provider_a_active or not self.provider_b_active:
             logger.info("One or both providers offline. Skipping full reconciliation.")
             self._sync_sequences()
-            return
+            return False
 
-        self._reconcile_table("media_library")
-        self._reconcile_table("trips_config")
-        self._reconcile_table("device_config")
+        ok = self._reconcile_table("media_library")
+        if RECONCILE_DIGEST_CHECK:
+            ok = self._reconcile_buckets() and ok
+        ok = self._reconcile_table("trips_config") and ok
+        ok = self._reconcile_table("device_config") and ok
             
         self._sync_sequences()
+        return ok
 
     def init_local_cache(self):
         """Initializes transient local SQLite connection (thread-safe)."""
@@ -372,7 +869,8 @@ class DatabaseBalancer:
             # All access is serialised by self._sqlite_lock.
             self.cache_conn = sqlite3.connect(cache_path, check_same_thread=False)
             self.cache_cursor = self.cache_conn.cursor()
-            
+            self.cache_conn.executescript(";\n".join(SQLITE_WRITER_PRAGMAS) + ";")
+
             # Ensure table schemas exist in SQLite
             self.cache_conn.execute('''
                 CREATE TABLE IF NOT EXISTS media_library (
@@ -388,9 +886,8 @@ class DatabaseBalancer:
                     thumbid TEXT
                 )
             ''')
-            self.cache_conn.execute("CREATE INDEX IF NOT EXISTS idx_filename ON media_library(filename)")
-            self.cache_conn.execute("CREATE INDEX IF NOT EXISTS idx_filename_nocase ON media_library(filename COLLATE NOCASE)")
-            self.cache_conn.execute("CREATE INDEX IF NOT EXISTS idx_hash ON media_library(file_hash)")
+            for create_index in SQLITE_MEDIA_INDEXES.values():
+                self.cache_conn.execute(create_index)
             
             self.cache_conn.execute('''
                 CREATE TABLE IF NOT EXISTS trips_config (
@@ -411,12 +908,19 @@ class DatabaseBalancer:
             ''')
             self.cache_conn.commit()
             
-            # Migration: add sl_no to existing device_config tables if not exists
-            try:
+            # Migration: add sl_no to existing device_config tables if not exists.
+            # Probing table_info avoids raising and swallowing an OperationalError on every startup.
+            device_cols = {row[1] for row in self.cache_conn.execute("PRAGMA table_info(device_config)")}
+            if "sl_no" not in device_cols:
                 self.cache_conn.execute("ALTER TABLE device_config ADD COLUMN sl_no INTEGER")
                 self.cache_conn.commit()
-            except sqlite3.OperationalError:
-                pass # Column already exists
+
+            # Opened after the schema exists; each sees a write once it's committed
+            for _ in range(CACHE_READER_POOL_SIZE):
+                reader = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True, check_same_thread=False)
+                reader.executescript(";\n".join(SQLITE_PRAGMAS) + ";")
+                self._reader_conns.append(reader)
+                self._readers.put((reader, reader.cursor()))
                 
             logger.info(f"✅ Local Cache initialized at {cache_path}")
             
@@ -437,137 +941,262 @@ class DatabaseBalancer:
                     if res and res[0] is not None:
                         max_sl_no = res[0]
                     
-            sql = "SELECT sl_no, file_hash, filename, file_size_bytes, upload_date, account_email, device_source, remote_id, album_name, thumbid FROM media_library WHERE sl_no > %s ORDER BY sl_no ASC"
-            rows = self.execute_query(sql, (max_sl_no,), fetch_all=True)
-            
-            if rows:
+            # Keyset pagination: pg8000 buffers a whole result set client-side, so fetching the
+            # delta in SYNC_PAGE_SIZE slices keeps memory bounded on a large catch-up
+            cols_str = SELECT_COLUMNS["media_library"]
+            sql = f"SELECT {cols_str} FROM media_library WHERE sl_no > %s ORDER BY sl_no ASC LIMIT %s"
+            insert_sql = f"REPLACE INTO media_library ({cols_str}) VALUES ({', '.join(['?'] * len(MEDIA_LIBRARY_COLUMNS))})"
+            synced = 0
+            # Empty cache: build each index once after the load instead of updating it per row
+            initial_load = max_sl_no == 0
+            if initial_load:
                 with self._sqlite_lock:
-                    for row in rows:
-                        self.cache_cursor.execute("""
-                            REPLACE INTO media_library 
-                            (sl_no, file_hash, filename, file_size_bytes, upload_date, account_email, device_source, remote_id, album_name, thumbid)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, row)
-                    self.cache_conn.commit()
-                
-            logger.info(f"✅ Sync Complete. {len(rows) if rows else 0} new records.")
-            
-            # Full sync of trips_config (replaces incremental, always authoritative)
+                    for index_name in SQLITE_MEDIA_INDEXES:
+                        self.cache_conn.execute(f"DROP INDEX IF EXISTS {index_name}")
             try:
-                trips_rows = self.execute_query('SELECT name, start, "end", require_gps, album_id FROM trips_config', fetch_all=True)
-
-                with self._sqlite_lock:
-                    self.cache_conn.execute("DELETE FROM trips_config")
+                while True:
+                    rows = self.execute_query(sql, (max_sl_no, SYNC_PAGE_SIZE), fetch_all=True)
+                    if not rows:
+                        break
+                    with self._sqlite_lock:
+                        self.cache_cursor.executemany(insert_sql, rows)
+                    synced += len(rows)
+                    max_sl_no = rows[-1][0]
+                    if len(rows) < SYNC_PAGE_SIZE:
+                        break
+            finally:
+                if initial_load:
+                    with self._sqlite_lock:
+                        for create_index in SQLITE_MEDIA_INDEXES.values():
+                            self.cache_conn.execute(create_index)
+            logger.info(f"✅ Sync Complete. {synced} new records.")
 
-                    if trips_rows:
-                        for row in trips_rows:
-                            is_gps_int = 1 if row[3] else 0
-                            self.cache_conn.execute('''
-                                INSERT INTO trips_config (name, start, "end", require_gps, album_id)
-                                VALUES (?, ?, ?, ?, ?)
-                            ''', (row[0], row[1], row[2], is_gps_int, row[4]))
-                        self.cache_conn.commit()
-                        logger.info(f"💾 Synced {len(trips_rows)} trips configurations to local cache.")
-                
-                # Sync device_config (full sync)
+            # Full sync of trips_config and device_config (replaces incremental, always authoritative).
+            # Both are fetched before touching SQLite so a failed query can't leave a table emptied.
+            trips_rows = device_rows = None
+            try:
+                trips_rows = self.execute_query('SELECT name, start, "end", require_gps, album_id FROM trips_config', fetch_all=True)
                 device_rows = self.execute_query('SELECT device_name, directories, sl_no FROM device_config', fetch_all=True)
-                
-                self.cache_conn.execute("DELETE FROM device_config")
-                
-                if device_rows:
-                    for row in device_rows:
-                        self.cache_conn.execute('''
-                            INSERT INTO device_config (device_name, directories, sl_no)
-                            VALUES (?, ?, ?)
-                        ''', (row[0], row[1], row[2]))
-                    self.cache_conn.commit()
-                    logger.info(f"💾 Synced {len(device_rows)} device configurations to local cache.")
             except Exception as e:
                 logger.warning(f"⚠️ Could not sync secondary configs: {e}")
-                
-            # Verify row counts after sync
-            cloud_count = 0
-            local_count = 0
-            
-            # Get Cloud count
-            count_sql = "SELECT COUNT(*) FROM media_library"
-            cloud_res = self.execute_query(count_sql, fetch_one=True)
-            if cloud_res and cloud_res[0] is not None:
-                cloud_count = cloud_res[0]
-                
-            # Get Local count
+
+            # One commit for the media catch-up and both config tables, rather than one per step
+            with self._sqlite_lock:
+                if trips_rows is not None:
+                    self.cache_conn.execute("DELETE FROM trips_config")
+                    self.cache_conn.executemany('''
+                        INSERT INTO trips_config (name, start, "end", require_gps, album_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [(row[0], row[1], row[2], 1 if row[3] else 0, row[4]) for row in trips_rows])
+                if device_rows is not None:
+                    self.cache_conn.execute("DELETE FROM device_config")
+                    self.cache_conn.executemany('''
+                        INSERT INTO device_config (device_name, directories, sl_no)
+                        VALUES (?, ?, ?)
+                    ''', device_rows)
+                self._commit_cache()
+                if synced:
+                    self._name_index = self._hash_index = None
+                    # The bulk load is when row stats shift. 0x10002 checks every table, not just ones this
+                    # connection queried; SQLite < 3.46 ignores that bit, so analyze large loads directly.
+                    if sqlite3.sqlite_version_info >= (3, 46):
+                        self.cache_conn.execute("PRAGMA optimize(0x10002)")
+                    elif synced >= SYNC_PAGE_SIZE:
+                        self.cache_conn.execute("ANALYZE media_library")
+            if trips_rows is not None:
+                self._invalidate_trips()
+            if trips_rows:
+                logger.info(f"💾 Synced {len(trips_rows)} trips configurations to local cache.")
+            if device_rows:
+                logger.info(f"💾 Synced {len(device_rows)} device configurations to local cache.")
+
+            # Verify after sync. Sync is incremental on sl_no, so comparing MAX(sl_no) (a primary-key
+            # lookup) catches a missed delta; a full COUNT(*) over the cloud table is opt-in.
+            local_max, local_count = 0, 0
             if self.cache_cursor:
                 with self._sqlite_lock:
-                    self.cache_cursor.execute("SELECT COUNT(*) FROM media_library")
+                    self.cache_cursor.execute("SELECT MAX(sl_no), COUNT(*) FROM media_library")
                     local_res = self.cache_cursor.fetchone()
-                    if local_res and local_res[0] is not None:
-                        local_count = local_res[0]
-                    
-            if cloud_count == local_count:
-                logger.info(f"✅ Local database is fully synchronized. (Total Rows: {local_count})")
+                    if local_res:
+                        local_max, local_count = local_res[0] or 0, local_res[1] or 0
+
+            if VERIFY_FULL_SYNC:
+                cloud_res = self.execute_query("SELECT COUNT(*) FROM media_library", fetch_one=True)
+                cloud_count = cloud_res[0] if cloud_res and cloud_res[0] is not None else 0
+                if cloud_count == local_count:
+                    self._cache_synced = True
+                    logger.info(f"✅ Local database is fully synchronized. (Total Rows: {local_count})")
+                else:
+                    logger.warning(f"⚠️ Row count mismatch after sync! Cloud: {cloud_count}, Local: {local_count}. Local database may be incomplete.")
             else:
-                logger.warning(f"⚠️ Row count mismatch after sync! Cloud: {cloud_count}, Local: {local_count}. Local database may be incomplete.")
+                cloud_res = self.execute_query("SELECT MAX(sl_no) FROM media_library", fetch_one=True)
+                cloud_max = cloud_res[0] if cloud_res and cloud_res[0] is not None else 0
+                if cloud_max == local_max:
+                    self._cache_synced = True
+                    logger.info(f"✅ Local database is fully synchronized. (Total Rows: {local_count})")
+                else:
+                    logger.warning(f"⚠️ sl_no mismatch after sync! Cloud max: {cloud_max}, Local max: {local_max}. Local database may be incomplete.")
                 
         except Exception as e:
             logger.error(f"❌ Sync failed: {e}")
 
+    @contextmanager
+    def _cache_reader(self):
+        """Yields a cursor for local-cache reads: a pooled read-only connection if open, else the shared one."""
+        if self._pending_writes:
+            # Readers only see committed rows; make our own deferred inserts visible first
+            with self._sqlite_lock:
+                self._commit_cache()
+        if self._reader_conns:
+            reader = self._readers.get()
+            try:
+                yield reader[1]
+            finally:
+                self._readers.put(reader)
+        else:
+            with self._sqlite_lock:
+                yield self.cache_cursor
+
     def get_all_media_filenames(self):
         """Returns a set of all filenames in media_library (lowercase) for priming the filename cache. Uses local cache when available."""
         if not self.cache_cursor:
             return set()
         try:
-            with self._sqlite_lock:
-                self.cache_cursor.execute("SELECT filename FROM media_library")
-                rows = self.cache_cursor.fetchall()
+            with self._cache_reader() as cursor:
+                cursor.execute("SELECT filename FROM media_library")
+                rows = cursor.fetchall()
             return {r[0].lower() for r in rows if r and r[0]}
         except Exception as e:
             logger.warning(f"Could not load filenames from DB for cache priming: {e}")
             return set()
 
+    def _local_index(self):
+        """Returns (lowercased filenames, hashes) present in the local cache, loading them on first use.
+
+        The sets are exact and the cache never deletes rows, so file_exists_* answer from them
+        without a query either way. Bulk cache writes (sync/reconcile) reset them; inserts add to them.
+        """
+        with self._sqlite_lock:
+            if self._name_index is None:
+                self.cache_cursor.execute("SELECT filename, file_hash FROM media_library")
+                names, hashes = set(), set()
+                for name, file_hash in self.cache_cursor.fetchall():
+                    if name: names.add(name.lower())
+                    if file_hash: hashes.add(file_hash)
+                self._name_index, self._hash_index = names, hashes
+            return self._name_index, self._hash_index
+
+    def _known_hit(self, hits: OrderedDict, key) -> bool:
+        with self._hits_lock:
+            if key in hits:
+                hits.move_to_end(key)
+                return True
+            return False
+
+    def _remember_hit(self, hits: OrderedDict, key):
+        with self._hits_lock:
+            hits[key] = True
+            hits.move_to_end(key)
+            if len(hits) > EXISTS_CACHE_SIZE:
+                hits.popitem(last=False)
+
     def file_exists_by_name(self, filename: str) -> bool:
         """Phase 1: Local Cache Check."""
-        filenames_to_check = [filename]
-        
         lower_name = filename.lower()
-        if lower_name.endswith('.jpg'):
-            filenames_to_check.extend([filename[:-4] + '.jpeg', filename[:-4] + '.JPEG'])
-        elif lower_name.endswith('.jpeg'):
-            filenames_to_check.extend([filename[:-5] + '.jpg', filename[:-5] + '.JPG'])
+        variants = _name_variants(lower_name)
+        if self._known_hit(self._name_hits, lower_name):
+            return True
 
         if self.cache_cursor:
             try:
-                with self._sqlite_lock:
-                    for fname in filenames_to_check:
-                        self.cache_cursor.execute("SELECT 1 FROM media_library WHERE filename = ? COLLATE NOCASE LIMIT 1", (fname,))
-                        if self.cache_cursor.fetchone() is not None:
-                            return True
-                return False
+                names, _ = self._local_index()
+                return any(v in names for v in variants)
             except Exception as e:
                 logger.error(f"Local cache query failed: {e}")
                 
-        for fname in filenames_to_check:
-            sql = "SELECT 1 FROM media_library WHERE filename ILIKE %s LIMIT 1"
-            res = self.execute_query(sql, (fname,), fetch_one=True)
-            if res: return True
+        # One round-trip for all variants; lower(filename) uses idx_media_filename_lower
+        sql = "SELECT EXISTS (SELECT 1 FROM media_library WHERE lower(filename) = ANY(%s))"
+        res = self.execute_query(sql, (variants,), fetch_one=True, prepared=True)
+        if res and res[0]:
+            self._remember_hit(self._name_hits, lower_name)
+            return True
         return False
 
     def file_exists_by_hash(self, file_hash: str) -> bool:
         """Phase 2: Local Cache Check."""
+        if self._known_hit(self._hash_hits, file_hash):
+            return True
         if self.cache_cursor:
             try:
-                with self._sqlite_lock:
-                    self.cache_cursor.execute("SELECT 1 FROM media_library WHERE file_hash = ? LIMIT 1", (file_hash,))
-                    if self.cache_cursor.fetchone() is not None:
-                        return True
-                return False
+                _, hashes = self._local_index()
+                return file_hash in hashes
             except Exception as e:
                 logger.error(f"Local cache query failed: {e}")
                 
-        sql = "SELECT 1 FROM media_library WHERE file_hash = %s LIMIT 1"
-        res = self.execute_query(sql, (file_hash,), fetch_one=True)
-        if res: return True
+        sql = "SELECT EXISTS (SELECT 1 FROM media_library WHERE file_hash = %s)"
+        res = self.execute_query(sql, (file_hash,), fetch_one=True, prepared=True)
+        if res and res[0]:
+            self._remember_hit(self._hash_hits, file_hash)
+            return True
         return False
 
+    def files_exist_by_names(self, filenames) -> set:
+        """Batch file_exists_by_name: returns the subset of `filenames` already in media_library.
+
+        Answered from the local key sets when the cache is enabled, otherwise with one cloud query.
+        """
+        found, pending = set(), {}
+        for filename in filenames:
+            lower_name = filename.lower()
+            if self._known_hit(self._name_hits, lower_name):
+                found.add(filename)
+            else:
+                pending[filename] = _name_variants(lower_name)
+        if not pending:
+            return found
+
+        wanted = {v for variants in pending.values() for v in variants}
+        present = None
+        if self.cache_cursor:
+            try:
+                names, _ = self._local_index()
+                present = wanted & names
+            except Exception as e:
+                logger.error(f"Local cache query failed: {e}")
+        if present is None:
+            sql = "SELECT lower(filename) FROM media_library WHERE lower(filename) = ANY(%s)"
+            rows = self.execute_query(sql, (sorted(wanted),), fetch_all=True, prepared=True)
+            present = {r[0] for r in rows or ()}
+
+        for filename, variants in pending.items():
+            if any(v in present for v in variants):
+                found.add(filename)
+                self._remember_hit(self._name_hits, variants[0])
+        return found
+
+    def files_exist_by_hashes(self, file_hashes) -> set:
+        """Batch file_exists_by_hash: returns the subset of `file_hashes` already in media_library."""
+        found = {h for h in file_hashes if self._known_hit(self._hash_hits, h)}
+        pending = set(file_hashes) - found
+        if not pending:
+            return found
+
+        present = None
+        if self.cache_cursor:
+            try:
+                _, hashes = self._local_index()
+                present = pending & hashes
+            except Exception as e:
+                logger.error(f"Local cache query failed: {e}")
+        if present is None:
+            sql = "SELECT file_hash FROM media_library WHERE file_hash = ANY(%s)"
+            rows = self.execute_query(sql, (sorted(pending),), fetch_all=True, prepared=True)
+            present = {r[0] for r in rows or ()}
+
+        for file_hash in present:
+            self._remember_hit(self._hash_hits, file_hash)
+        return found | present
+
     def get_file_by_hash(self, file_hash: str) -> dict:
         """Phase 2: Local Cache Check, returns record dict if found."""
         cols = ['file_hash', 'filename', 'file_size_bytes', 'upload_date', 'account_email', 'device_source', 'remote_id', 'album_name', 'thumbid']
@@ -575,50 +1204,109 @@ class DatabaseBalancer:
         
         if self.cache_cursor:
             try:
-                with self._sqlite_lock:
-                    self.cache_cursor.execute(f"SELECT {cols_str} FROM media_library WHERE file_hash = ? LIMIT 1", (file_hash,))
-                    row = self.cache_cursor.fetchone()
-                    if row:
-                        return dict(zip(cols, row))
+                _, hashes = self._local_index()
+                if file_hash in hashes:
+                    with self._cache_reader() as cursor:
+                        cursor.execute(f"SELECT {cols_str} FROM media_library WHERE file_hash = ? LIMIT 1", (file_hash,))
+                        row = cursor.fetchone()
+                        if row:
+                            return dict(zip(cols, row))
+                elif self._cache_synced:
+                    return None
             except Exception as e:
                 logger.error(f"Local cache query failed: {e}")
                 
         sql = f"SELECT {cols_str} FROM media_library WHERE file_hash = %s LIMIT 1"
-        row = self.execute_query(sql, (file_hash,), fetch_one=True)
+        row = self.execute_query(sql, (file_hash,), fetch_one=True, prepared=True)
         if row: return dict(zip(cols, row))
         return None
 
+    def _commit_cache(self, force: bool = True):
+        """Commits the cache writer; with force=False only once enough inserts are pending. Call under _sqlite_lock."""
+        if not force and self._pending_writes < CACHE_COMMIT_ROWS \
+                and time.monotonic() - self._last_commit < CACHE_COMMIT_SECS:
+            if self._flush_timer is None:
+                # Nothing may follow this insert; make sure the rows land within CACHE_COMMIT_SECS anyway
+                self._flush_timer = threading.Timer(CACHE_COMMIT_SECS, self._flush_cache)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            return
+        self.cache_conn.commit()
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+    def _flush_cache(self):
+        """Timer callback: commits rows a quiet insert burst left pending."""
+        with self._sqlite_lock:
+            self._flush_timer = None
+            if self._pending_writes and self.cache_conn:
+                try:
+                    self._commit_cache()
+                except Exception as e:
+                    logger.warning(f"⚠️ Deferred cache commit failed: {e}")
+
     def insert_file(self, file_data: dict):
         """Inserts a new file record."""
-        keys = []
-        vals = []
-        for k, v in file_data.items():
-            if k not in ['id', 'sl_no']:
-                keys.append(k)
-                vals.append(v)
-                
-        cols_str = ', '.join(keys)
-        placeholders = ', '.join(['%s'] * len(keys))
-        
-        sql = f"INSERT INTO media_library ({cols_str}) VALUES ({placeholders}) RETURNING sl_no, {cols_str}"
-        row = self.execute_query(sql, tuple(vals), is_write=True, fetch_one=True)
-        
-        if self.cache_cursor and row:
-            returned_keys = ['sl_no'] + keys
-            sqlite_placeholders = ', '.join(['?'] * len(returned_keys))
-            sqlite_cols = ', '.join(returned_keys)
-            sqlite_insert = f"REPLACE INTO media_library ({sqlite_cols}) VALUES ({sqlite_placeholders})"
-            with self._sqlite_lock:
-                self.cache_cursor.execute(sqlite_insert, row)
-                self.cache_conn.commit()
+        self.insert_files_bulk([file_data])
+
+    def insert_files_bulk(self, records: list):
+        """Inserts file records with one multi-row INSERT ... RETURNING per provider and batch.
+
+        Records sharing a column set are grouped; the returned rows (with their sl_no) are
+        mirrored into the local cache with a single executemany, committed in coalesced batches.
+        """
+        groups = {}
+        for file_data in records:
+            # Sorted so equal column sets share one SQL text (and one prepared statement)
+            keys = tuple(sorted(k for k in file_data if k not in ('id', 'sl_no')))
+            groups.setdefault(keys, []).append(tuple(file_data[k] for k in keys))
+
+        for keys, rows in groups.items():
+            returned_keys = ('sl_no',) + keys
+            for i in range(0, len(rows), INSERT_BATCH_SIZE):
+                batch = rows[i:i + INSERT_BATCH_SIZE]
+                sql, sqlite_insert = _insert_sql(keys, len(batch))
+                params = tuple(v for row in batch for v in row)
+                # Single-row inserts repeat the same text, so they're worth a cached prepared statement
+                returned = self.execute_query(sql, params, is_write=True, fetch_all=True, prepared=len(batch) == 1)
+
+                inserted = [dict(zip(returned_keys, row)) for row in returned or ()]
+                names = [rec['filename'].lower() for rec in inserted if rec.get('filename')]
+                hashes = [rec['file_hash'] for rec in inserted if rec.get('file_hash')]
+                for name in names: self._remember_hit(self._name_hits, name)
+                for file_hash in hashes: self._remember_hit(self._hash_hits, file_hash)
+
+                if self.cache_cursor and returned:
+                    with self._sqlite_lock:
+                        self.cache_cursor.executemany(sqlite_insert, returned)
+                        self._pending_writes += len(returned)
+                        self._commit_cache(force=False)
+                        if self._name_index is not None:
+                            self._name_index.update(names)
+                            self._hash_index.update(hashes)
 
     def get_trips(self):
-        """Fetches all active trips."""
+        """Fetches all active trips (memoized for TRIPS_TTL_SECS; callers get their own copies)."""
+        with self._trips_lock:
+            if self._trips_cache is not None and time.monotonic() - self._trips_cache_ts < TRIPS_TTL_SECS:
+                return [dict(t) for t in self._trips_cache]
+
+        trips = self._load_trips()
+        with self._trips_lock:
+            self._trips_cache = trips
+            self._trips_cache_ts = time.monotonic()
+        return [dict(t) for t in trips]
+
+    def _invalidate_trips(self):
+        with self._trips_lock:
+            self._trips_cache = None
+
+    def _load_trips(self):
         if self.cache_cursor:
             try:
-                with self._sqlite_lock:
-                    self.cache_cursor.execute("SELECT name, start, end, require_gps, album_id FROM trips_config")
-                    rows = self.cache_cursor.fetchall()
+                with self._cache_reader() as cursor:
+                    cursor.execute("SELECT name, start, end, require_gps, album_id FROM trips_config")
+                    rows = cursor.fetchall()
                     if rows:
                         return [{"name": r[0], "start": r[1], "end": r[2], "require_gps": bool(r[3]), "album_id": r[4]} for r in rows]
             except Exception as e:
@@ -634,6 +1322,7 @@ class DatabaseBalancer:
         try:
             sql = "UPDATE trips_config SET album_id = %s WHERE name = %s"
             self.execute_query(sql, (album_id, trip_name), is_write=True)
+            self._invalidate_trips()
             
             if self.cache_cursor:
                 with self._sqlite_lock:
@@ -646,12 +1335,11 @@ class DatabaseBalancer:
     def get_device_directories(self, device_name: str) -> list:
         """Fetches the comma-separated directory string from device_config and returns a list."""
         paths = []
-        if self.cache_conn: # Assuming self.use_local_cache means self.cache_conn is active
+        if self.cache_cursor:
             try:
-                with self._sqlite_lock:
-                    cur = self.cache_conn.cursor()
-                    cur.execute("SELECT directories FROM device_config WHERE device_name = ?", (device_name,))
-                    res = cur.fetchone()
+                with self._cache_reader() as cursor:
+                    cursor.execute("SELECT directories FROM device_config WHERE device_name = ?", (device_name,))
+                    res = cursor.fetchone()
                     if res and res[0]:
                         dirs = res[0].split(',')
                         paths = [d.strip() for d in dirs if d.strip()]
@@ -695,6 +1383,8 @@ class DatabaseBalancer:
         try:
             os.makedirs(os.path.dirname(backup_path), exist_ok=True)
             with self._sqlite_lock:
+                # backup() can't finish while the writer sits in an open transaction
+                self._commit_cache()
                 with sqlite3.connect(backup_path) as backup_conn:
                     self.cache_conn.backup(backup_conn)
             logger.info(f"💾 Successfully backed up database to {backup_path}")
@@ -713,20 +1403,31 @@ class DatabaseBalancer:
         
     def close(self):
         """Closes all active database connections cleanly."""
+        for reader in self._reader_conns:
+            try:
+                reader.close()
+            except Exception: pass
+        self._reader_conns = []
         if self.cache_conn:
             try:
-                self.cache_conn.close()
+                with self._sqlite_lock:
+                    if self._flush_timer is not None:
+                        self._flush_timer.cancel()
+                        self._flush_timer = None
+                    self._commit_cache()  # deferred insert mirrors
+                    # Refreshes planner stats for idx_filename/idx_hash only where they've drifted
+                    self.cache_conn.execute("PRAGMA optimize")
+                    self.cache_conn.close()
                 logger.info("💾 Local SQLite cache connection closed.")
             except Exception as e:
                 logger.warning(f"⚠️ Error closing SQLite connection: {e}")
-        if self.conn_a:
-            try:
-                self.conn_a.close()
-            except Exception: pass
-        if self.conn_b:
-            try:
-                self.conn_b.close()
-            except Exception: pass
+            self.cache_conn = self.cache_cursor = None
+        self._write_pool.shutdown(wait=True)
+        for pool in (self.pool_a, self.pool_b):
+            if pool:
+                try:
+                    pool.close_all()
+                except Exception: pass
 
     def __enter__(self):
         return self
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+
+class CircuitBreaker:
+    """CLOSED/OPEN/HALF_OPEN breaker guarding a single database provider.
+
+    After `fail_threshold` consecutive connection-level failures the breaker opens and
+    callers skip the provider without touching the network. Once `reset_secs` have
+    passed it goes HALF_OPEN and lets one probe through at a time; `half_open_successes`
+    successful probes close it again, a failed probe re-opens it with the wait doubled
+    (capped at `max_reset_secs`) so a provider that stays down is probed less and less.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, name: str, is_connection_error=None, fail_threshold: int = None,
+                 reset_secs: float = None, half_open_successes: int = None, max_reset_secs: float = None):
+        self.name = name
+        self._is_connection_error = is_connection_error or (lambda e: True)
+        self.fail_threshold = fail_threshold or int(os.getenv("CB_FAIL_THRESHOLD", "5"))
+        self.reset_secs = reset_secs or float(os.getenv("CB_RESET_SECS", "60"))
+        self.half_open_successes = half_open_successes or int(os.getenv("CB_HALFOPEN_SUCC", "3"))
+        self.max_reset_secs = max(self.reset_secs, max_reset_secs or float(os.getenv("CB_MAX_RESET_SECS", "600")))
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.successes = 0
+        self.opened_at = 0.0
+        self.current_reset_secs = self.reset_secs
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _reset_elapsed(self) -> bool:
+        return time.monotonic() - self.opened_at >= self.current_reset_secs
+
+    def available(self) -> bool:
+        """Non-mutating check: would allow() let a call through right now?"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return self._reset_elapsed()
+            return not self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Returns True if a call may go to the provider. In HALF_OPEN only one probe is let through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if not self._reset_elapsed():
+                    return False
+                self.state = self.HALF_OPEN
+                self.successes = 0
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> bool:
+        """Records a successful call. Returns True if this closed a HALF_OPEN breaker."""
+        with self._lock:
+            self.failures = 0
+            if self.state != self.HALF_OPEN:
+                return False
+            self._probe_in_flight = False
+            self.successes += 1
+            if self.successes >= self.half_open_successes:
+                self.state = self.CLOSED
+                self.current_reset_secs = self.reset_secs
+                return True
+            return False
+
+    def record_failure(self, e: Exception) -> bool:
+        """Records a failed call. Query errors (the provider answered) don't count.
+
+        Returns True only when this failure moved a CLOSED breaker to OPEN.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+            if not self._is_connection_error(e):
+                return False
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.current_reset_secs = min(self.current_reset_secs * 2, self.max_reset_secs)
+                self._open()
+                return False
+            if self.state == self.CLOSED and self.failures >= self.fail_threshold:
+                self._open()
+                return True
+            return False
+
+    def trip(self):
+        """Forces the breaker open, e.g. when the initial connection fails."""
+        with self._lock:
+            self._open()
+
+    def disable(self):
+        """Holds the breaker open for good (provider not configured)."""
+        with self._lock:
+            self._open()
+            self.opened_at = float("inf")
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.successes = 0
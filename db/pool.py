@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pg8000.dbapi
+
+
+class ConnectionPool:
+    """Bounded LIFO pool of autocommit pg8000 connections to a single provider.
+
+    Connections are opened lazily up to `size`. A connection that sat idle longer
+    than `idle_check_secs` is validated with `SELECT 1` on checkout; connections
+    that fail with a connection-level error are discarded instead of returned.
+    """
+
+    def __init__(self, connect_kwargs: dict, size: int = 4, idle_check_secs: float = 30.0,
+                 is_connection_error=None, checkout_timeout: float = 30.0):
+        self._connect_kwargs = connect_kwargs
+        self._size = max(1, size)
+        self._idle_check_secs = idle_check_secs
+        self._is_connection_error = is_connection_error or (lambda e: True)
+        self._checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self):
+        conn = pg8000.dbapi.connect(**self._connect_kwargs)
+        conn.autocommit = True
+        return conn
+
+    def _ping(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def get(self):
+        """Checks out a connection, opening a new one if the pool is below its size."""
+        while True:
+            if self._closed:
+                raise ConnectionError("Connection pool closed")
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self._size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn, last_used = self._idle.get(timeout=self._checkout_timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No pooled connection available after {self._checkout_timeout}s")
+
+            if conn is None:
+                # Wake-up token from close_all(); pass it on to the next waiter
+                self._idle.put((None, 0.0))
+                raise ConnectionError("Connection pool closed")
+
+            if time.monotonic() - last_used > self._idle_check_secs and not self._ping(conn):
+                self.discard(conn)
+                continue
+            return conn
+
+    def put(self, conn):
+        """Returns a healthy connection to the pool, or closes it if the pool was closed."""
+        if self._closed:
+            self.discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def discard(self, conn):
+        """Closes a broken connection and frees its slot."""
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.get()
+        try:
+            yield conn
+        except Exception as e:
+            if self._is_connection_error(e):
+                self.discard(conn)
+            else:
+                self.put(conn)
+            raise
+        else:
+            self.put(conn)
+
+    def close_all(self):
+        """Closes every idle connection. Checked-out connections are closed when returned."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                self.discard(conn)
+        # Threads blocked in get() would otherwise wait out checkout_timeout on a dead pool
+        self._idle.put((None, 0.0))
@@ -1,11 +1,25 @@
 import os
+import re
 import sys
 import json
 import logging
-from datetime import datetime
+import atexit
+import threading
+import urllib.parse
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
+from datetime import date, datetime
 import pg8000.native
 from dotenv import load_dotenv
 
+# Optional fast JSON encoder for large raw-SQL result sets
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db.balancer import DatabaseManager
 
@@ -15,21 +29,167 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("QueryTool")
 
-def check_trip_exists(db, name):
-    """Check if a trip with the given name already exists in the Database."""
-    sql = "SELECT name FROM trips_config WHERE name = %s LIMIT 1"
+# Persistent raw-SQL connections, one per provider, reused across queries until they error.
+_raw_conns = {}
+_raw_conns_lock = threading.Lock()
+
+# Server-side prepared statements for raw queries, keyed by (provider, query text), LRU-evicted.
+_prep_cache = OrderedDict()
+_PREP_CACHE_SIZE = 64
+
+@lru_cache(maxsize=None)
+def _parse_db_url(db_url):
+    parsed = urllib.parse.urlparse(db_url)
+    return {
+        "user": parsed.username,
+        "host": parsed.hostname,
+        "database": parsed.path.lstrip('/'),
+        "port": parsed.port or 5432,
+        "password": parsed.password
+    }
+
+def _get_raw_conn(name, db_url):
+    """Returns the cached pg8000 connection for a provider, connecting lazily on first use."""
+    with _raw_conns_lock:
+        con = _raw_conns.get(name)
+        if con is None:
+            con = pg8000.native.Connection(**_parse_db_url(db_url))
+            _raw_conns[name] = con
+        return con
+
+def _drop_raw_conn(name):
+    """Discards a broken cached connection so the next query reconnects."""
+    with _raw_conns_lock:
+        con = _raw_conns.pop(name, None)
+        # Prepared statements die with their connection
+        for key in [k for k in _prep_cache if k[0] == name]:
+            del _prep_cache[key]
+    if con is not None:
+        try:
+            con.close()
+        except Exception:
+            pass
+
+def _close_raw_conns():
+    for name in list(_raw_conns):
+        _drop_raw_conn(name)
+
+atexit.register(_close_raw_conns)
+
+def _default_serializer(obj):
+    """JSON fallback for values the encoder can't handle natively (dates, Decimals, ...)."""
+    if isinstance(obj, date):
+        return obj.isoformat()
+    return str(obj)
+
+def _dumps_indented(obj, default):
+    """json.dumps(obj, indent=2) using orjson when it is installed."""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=default).decode()
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib encoder handles them
+    return json.dumps(obj, indent=2, default=default)
+
+def _write_json_rows(columns, rows, default, batch_size=1000):
+    """Streams rows to stdout as a JSON list of objects, one batch at a time.
+
+    Produces the same text as json.dumps(list_of_dicts, indent=2) without building
+    the per-row dicts list or the full output string in memory.
+    """
+    sys.stdout.write("[\n")
+    for start in range(0, len(rows), batch_size):
+        batch = [dict(zip(columns, row)) for row in rows[start:start + batch_size]]
+        # One encoder call per batch; dropping the list's "[\n" and "\n]" leaves the rows
+        # already indented as they'd appear inside the full list
+        sys.stdout.write(_dumps_indented(batch, default)[2:-2])
+        sys.stdout.write(",\n" if start + batch_size < len(rows) else "\n")
+    sys.stdout.write("]\n")
+    sys.stdout.flush()
+
+def _close_stmt(stmt):
     try:
-        res = db.execute_query(sql, (name,), fetch_one=True)
-        if res:
-            return True
-    except Exception as e:
-        print(f"⚠️ Warning: Could not verify if trip exists due to connection error: {e}")
-    return False
+        stmt.close()
+    except Exception:
+        pass
+
+def _run_prepared(name, con, query):
+    """Runs a raw query via a prepared statement cached by query text, so repeats skip parse/plan.
+
+    Returns (rows, columns, row_count). Only row-returning statements are prepared; DML/DDL and
+    anything that can't be prepared run as plain queries so the connection reports row_count.
+    """
+    key = (name, query)
+    stmt = _prep_cache.get(key)
+    if stmt is None:
+        try:
+            stmt = con.prepare(query)
+            if not stmt.cols:
+                _close_stmt(stmt)
+                stmt = False
+        except pg8000.native.DatabaseError:
+            # Not preparable (e.g. several commands in one string)
+            stmt = False
+        _prep_cache[key] = stmt
+        if len(_prep_cache) > _PREP_CACHE_SIZE:
+            _, oldest = _prep_cache.popitem(last=False)
+            if oldest:
+                _close_stmt(oldest)
+    else:
+        _prep_cache.move_to_end(key)
+    if stmt is False:
+        rows = con.run(query)
+        return rows, con.columns, con.row_count
+    for attempt in range(2):
+        try:
+            rows = stmt.run()
+            break
+        except pg8000.native.DatabaseError as e:
+            _prep_cache.pop(key, None)
+            _close_stmt(stmt)
+            # The table changed shape since we prepared: re-prepare and retry once
+            if attempt == 1 or "cached plan must not change result type" not in str(e):
+                raise
+            stmt = _prep_cache[key] = con.prepare(query)
+    return rows, stmt.columns, len(rows)
+
+# Menus are written in one go rather than one print per line
+_MAIN_MENU = (
+    "\nOptions:\n"
+    "1. Count Total Records\n"
+    "2. Search by Filename\n"
+    "3. Search by Album Name\n"
+    "4. Create a New Trip\n"
+    "5. Manage Device Config\n"
+    "6. Custom Query (Raw SQL)\n"
+    "7. Exit\n"
+)
+
+_DEVICE_MENU = (
+    "\nOptions:\n"
+    "1. Add a Directory\n"
+    "2. Delete a Directory\n"
+    "3. Save and Exit\n"
+    "4. Cancel (Exit without saving)\n"
+)
+
+# Rows fetched per page for "Search by Filename" / "Search by Album Name"
+SEARCH_PAGE_SIZE = 500
+
+_SEARCH_COLS = "sl_no, file_hash, filename, file_size_bytes, upload_date, account_email, device_source, album_name"
+_SEARCH_FILENAME_SQL = f"SELECT {_SEARCH_COLS} FROM media_library WHERE filename ILIKE %s ORDER BY sl_no LIMIT %s OFFSET %s"
+_SEARCH_ALBUM_SQL = f"SELECT {_SEARCH_COLS} FROM media_library WHERE album_name = %s ORDER BY sl_no LIMIT %s OFFSET %s"
+
+_DATE_RE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
 
 def validate_date(date_str):
     """Validate that the string matches YYYY-MM-DD."""
+    m = _DATE_RE.match(date_str)
+    if not m:
+        return False
     try:
-        datetime.strptime(date_str, "%Y-%m-%d")
+        # Calendar check (month lengths, leap years) without strptime's format parsing
+        datetime(*map(int, m.groups()))
         return True
     except ValueError:
         return False
@@ -38,19 +198,12 @@ def create_trip(db):
     print("\n🌟 Create a New Trip Configuration 🌟")
     print("-" * 40)
     
-    # 1. Trip Name
+    # 1. Trip Name (uniqueness is enforced by the INSERT itself, see below)
     while True:
         name = input("Enter Trip Name: ").strip()
-        if not name:
-            print("❌ Name cannot be empty.")
-            continue
-            
-        print("Checking for conflicts...")
-        if check_trip_exists(db, name):
-            print(f"❌ A trip with the name '{name}' already exists in the database.")
-            print("Please use a different name.")
-        else:
+        if name:
             break
+        print("❌ Name cannot be empty.")
             
     # 2. Start Date
     while True:
@@ -103,9 +256,14 @@ def create_trip(db):
     # Insert sequence
     print("⏳ Saving to Cloud...")
     try:
-        sql = "INSERT INTO trips_config (name, start, \"end\", require_gps, album_id) VALUES (%s, %s, %s, %s, %s)"
+        # Conflict check and insert in one round-trip: an empty RETURNING means the name is taken
+        sql = "INSERT INTO trips_config (name, start, \"end\", require_gps, album_id) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (name) DO NOTHING RETURNING name"
         params = (name, start, end, require_gps, album_id)
-        db.execute_query(sql, params, is_write=True)
+        res = db.execute_query(sql, params, is_write=True, fetch_one=True)
+        if res is None:
+            print(f"❌ A trip with the name '{name}' already exists in the database.")
+            print("Please use a different name.")
+            return
         print(f"✅ Trip '{name}' successfully securely saved to the cloud!")
         print("The changes will be automatically fetched the next time `main_sql.py` runs.")
     except Exception as e:
@@ -117,40 +275,31 @@ def execute_raw_sql(query):
         "Neon": os.getenv("NEON_DB_URL")
     }
     
-    import urllib.parse
-    import datetime as dt
-    def default_serializer(obj):
-        if isinstance(obj, (dt.date, dt.datetime)):
-            return obj.isoformat()
-        return str(obj)
-
     for name, db_url in dbs.items():
         if not db_url:
             print(f"❌ Missing {name.upper()}_DB_URL in .env required for raw SQL queries.")
             continue
             
         try:
-            parsed = urllib.parse.urlparse(db_url)
-            con = pg8000.native.Connection(
-                user=parsed.username,
-                host=parsed.hostname,
-                database=parsed.path.lstrip('/'),
-                port=parsed.port or 5432,
-                password=parsed.password
-            )
             print(f"\n⏳ Executing query on {name}...")
-            res = con.run(query)
-            columns = [col['name'] for col in con.columns] if con.columns else []
+            for attempt in range(2):
+                con = _get_raw_conn(name, db_url)
+                try:
+                    res, cols, row_count = _run_prepared(name, con, query)
+                    break
+                except (pg8000.native.InterfaceError, OSError):
+                    # Stale socket (server restart, idle timeout): reconnect once and retry
+                    _drop_raw_conn(name)
+                    if attempt == 1:
+                        raise
+            columns = [col['name'] for col in cols] if cols else []
             
             if columns and res:
                 # Format and print as JSON-like list of dicts
-                result_list = [dict(zip(columns, row)) for row in res]
-                print(f"✅ Query successful on {name}. Found {len(result_list)} records:\n")
-                print(json.dumps(result_list, indent=2, default=default_serializer))
+                print(f"✅ Query successful on {name}. Found {len(res)} records:\n")
+                _write_json_rows(columns, res, _default_serializer)
             else:
-                print(f"✅ Query executed successfully on {name}. Rows affected: {con.row_count}")
-                
-            con.close()
+                print(f"✅ Query executed successfully on {name}. Rows affected: {row_count}")
         except Exception as e:
             print(f"❌ {name} SQL Execution Error: {e}")
 
@@ -189,11 +338,7 @@ def manage_device_config(db):
             for i, d in enumerate(existing_dirs, 1):
                 print(f"  {i}. {d}")
         
-        print("\nOptions:")
-        print("1. Add a Directory")
-        print("2. Delete a Directory")
-        print("3. Save and Exit")
-        print("4. Cancel (Exit without saving)")
+        sys.stdout.write(_DEVICE_MENU)
         
         choice = input("Enter choice (1-4): ").strip()
         
@@ -239,6 +384,73 @@ def manage_device_config(db):
         else:
             print("❌ Invalid option.")
 
+def _dbs_to_check(db):
+    """Lists (name, connection context) for every live backend the tool can query directly."""
+    dbs_to_check = []
+    if getattr(db, 'provider_a_active', False) and getattr(db, 'pool_a', None):
+        dbs_to_check.append(("Nhost", db.acquire('A')))
+    if getattr(db, 'provider_b_active', False) and getattr(db, 'pool_b', None):
+        dbs_to_check.append(("Neon", db.acquire('B')))
+    if getattr(db, 'cache_conn', None):
+        dbs_to_check.append(("Local Cache", nullcontext(db.cache_conn)))
+    return dbs_to_check
+
+def _opt_count(db):
+    sql = "SELECT COUNT(*) FROM media_library"
+    print("\n📊 Total Records by Database:")
+    for name, conn_ctx in _dbs_to_check(db):
+        try:
+            with conn_ctx as conn:
+                cur = conn.cursor()
+                cur.execute(sql)
+                res = cur.fetchone()
+            print(f"  - {name}: {res[0] if res else 'Unknown'}")
+        except Exception as e:
+            print(f"  - {name}: Error ({e})")
+
+def _opt_search_filename(db):
+    filename = input("Enter filename (or part of it): ").strip()
+    if not filename:
+        # An empty pattern would match (and page through) the whole table
+        print("❌ Filename cannot be empty.")
+        return
+    _exec_request(db, _SEARCH_FILENAME_SQL, (f"%{filename}%",))
+
+def _opt_search_album(db):
+    album = input("Enter album name: ").strip()
+    if not album:
+        print("❌ Album name cannot be empty.")
+        return
+    _exec_request(db, _SEARCH_ALBUM_SQL, (album,))
+
+def _opt_raw_sql(db):
+    print("\nEnter a raw SQL query (e.g., SELECT * FROM media_library WHERE file_size_bytes > 1000000)")
+    print("Type your query below. End your query with a ';' and press Enter, or press Ctrl+Z/Ctrl+D to execute:")
+    lines = []
+    try:
+        while True:
+            prompt = "Query: " if not lines else "... "
+            line = input(prompt)
+            lines.append(line)
+            if line.strip().endswith(';'):
+                break
+    except EOFError:
+        pass
+    
+    query = "\n".join(lines).strip()
+    if query:
+        execute_raw_sql(query)
+
+# Menu choice -> handler(db). "7" (Exit) is handled by the loop itself.
+_ACTIONS = {
+    "1": _opt_count,
+    "2": _opt_search_filename,
+    "3": _opt_search_album,
+    "4": create_trip,
+    "5": manage_device_config,
+    "6": _opt_raw_sql,
+}
+
 def run_query():
     print("🚀 Database Query Tool")
     print("----------------------")
@@ -251,97 +463,45 @@ def run_query():
         return
 
     while True:
-        print("\nOptions:")
-        print("1. Count Total Records")
-        print("2. Search by Filename")
-        print("3. Search by Album Name")
-        print("4. Create a New Trip")
-        print("5. Manage Device Config")
-        print("6. Custom Query (Raw SQL)")
-        print("7. Exit")
+        sys.stdout.write(_MAIN_MENU)
         
         choice = input("\nEnter choice (1-7): ").strip()
         
-        if choice == "1":
-            sql = "SELECT COUNT(*) FROM media_library"
-            print("\n📊 Total Records by Database:")
-            dbs_to_check = []
-            if getattr(db, 'provider_a_active', False) and getattr(db, 'conn_a', None):
-                dbs_to_check.append(("Nhost", db.conn_a))
-            if getattr(db, 'provider_b_active', False) and getattr(db, 'conn_b', None):
-                dbs_to_check.append(("Neon", db.conn_b))
-            if getattr(db, 'cache_conn', None):
-                dbs_to_check.append(("Local Cache", db.cache_conn))
-                
-            for name, conn in dbs_to_check:
-                try:
-                    cur = conn.cursor()
-                    cur.execute(sql)
-                    res = cur.fetchone()
-                    print(f"  - {name}: {res[0] if res else 'Unknown'}")
-                except Exception as e:
-                    print(f"  - {name}: Error ({e})")
-
-        elif choice == "2":
-            filename = input("Enter filename (or part of it): ").strip()
-            sql = "SELECT sl_no, file_hash, filename, file_size_bytes, upload_date, account_email, device_source, album_name FROM media_library WHERE filename ILIKE %s"
-            _exec_request(db, sql, (f"%{filename}%",))
-
-        elif choice == "3":
-            album = input("Enter album name: ").strip()
-            sql = "SELECT sl_no, file_hash, filename, file_size_bytes, upload_date, account_email, device_source, album_name FROM media_library WHERE album_name = %s"
-            _exec_request(db, sql, (album,))
-
-        elif choice == "4":
-            create_trip(db)
-            
-        elif choice == "5":
-            manage_device_config(db)
-            
-        elif choice == "6":
-            print("\nEnter a raw SQL query (e.g., SELECT * FROM media_library WHERE file_size_bytes > 1000000)")
-            print("Type your query below. End your query with a ';' and press Enter, or press Ctrl+Z/Ctrl+D to execute:")
-            lines = []
-            try:
-                while True:
-                    prompt = "Query: " if not lines else "... "
-                    line = input(prompt)
-                    lines.append(line)
-                    if line.strip().endswith(';'):
-                        break
-            except EOFError:
-                pass
-            
-            query = "\n".join(lines).strip()
-            if query:
-                execute_raw_sql(query)
-
+        action = _ACTIONS.get(choice)
+        if action:
+            action(db)
         elif choice == "7":
             print("👋 Bye!")
             break
+        else:
+            print("❌ Invalid option.")
 
-def _exec_request(db, sql, params):
-    dbs_to_check = []
-    if getattr(db, 'provider_a_active', False) and getattr(db, 'conn_a', None):
-        dbs_to_check.append(("Nhost", db.conn_a))
-    if getattr(db, 'provider_b_active', False) and getattr(db, 'conn_b', None):
-        dbs_to_check.append(("Neon", db.conn_b))
-    if getattr(db, 'cache_conn', None):
-        dbs_to_check.append(("Local Cache", db.cache_conn))
-        
-    for name, conn in dbs_to_check:
+def _exec_request(db, sql, params, page_size=SEARCH_PAGE_SIZE):
+    for name, conn_ctx in _dbs_to_check(db):
         print(f"\n--- ⏳ Querying {name} ---")
         try:
-            cur = conn.cursor()
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            
-            if rows:
-                print(f"✅ Found {len(rows)} records on {name}:\n")
-                for r in rows:
-                     print(r)
-            else:
-                print(f"❌ Query returned nothing on {name}.")
+            with conn_ctx as conn:
+                cur = conn.cursor()
+                offset = 0
+                while True:
+                    # sql ends with "LIMIT %s OFFSET %s"; page through matches server-side
+                    cur.execute(sql, params + (page_size, offset))
+                    rows = cur.fetchall()
+                
+                    if rows:
+                        print(f"✅ Showing records {offset + 1}-{offset + len(rows)} on {name}:\n")
+                        # One write for the whole page instead of a print (and flush) per row
+                        sys.stdout.write("\n".join(map(repr, rows)) + "\n")
+                        sys.stdout.flush()
+                    elif offset == 0:
+                        print(f"❌ Query returned nothing on {name}.")
+                    
+                    if len(rows) < page_size:
+                        break
+                    more = input(f"Show next {page_size}? (Y/n): ").strip().lower()
+                    if more in ['n', 'no']:
+                        break
+                    offset += page_size
         except Exception as e:
             print(f"❌ Request Failed on {name}: {e}")
 
@@ -1,12 +1,12 @@
 import os
 import json
-import smtplib
-from email.message import EmailMessage
 import pickle
 import subprocess
 import socket
 import time
-from google.auth.transport.requests import Request
+import queue
+import atexit
+import threading
 import infra.logger as logger
 
 # Global Config references
@@ -17,13 +17,13 @@ ACTIVE_ACC_FILE = os.path.join(DATA_DIR, "active_account.txt")
 _raw_accounts = os.getenv("GOOGLE_ACCOUNTS", "")
 ACCOUNTS = [a.strip() for a in _raw_accounts.split(",") if a.strip()]
 if not ACCOUNTS:
-    import infra.logger as _startup_logger
-    _startup_logger.error("❌ GOOGLE_ACCOUNTS is not set in .env. Please add a comma-separated list of Google account emails.")
+    logger.error("❌ GOOGLE_ACCOUNTS is not set in .env. Please add a comma-separated list of Google account emails.")
 
+# SMTP config is read once at import; senders never touch os.environ
 smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-smtp_port = os.getenv("SMTP_PORT", "587")
+smtp_port = os.getenv("SMTP_PORT", "587")  # parsed when connecting so a bad value only breaks email
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
-RECEIVER_EMAIL = os.getenv("RECEIVER_EMAIL")
+RECEIVER_EMAIL = os.getenv("RECEIVER_EMAIL") or SENDER_EMAIL  # same default as the init wizard
 APP_PASSWORD = os.getenv("APP_PASSWORD")
 
 def wait_for_internet(timeout=5, retry_interval=10):
@@ -40,26 +40,108 @@ def wait_for_internet(timeout=5, retry_interval=10):
                 first_attempt = False
             time.sleep(retry_interval)
 
-def send_email(subject, body, device_name="Unknown_Device"):
-    if not SENDER_EMAIL or not APP_PASSWORD:
-        logger.warning("⚠️ Email not configured. Skipping email.")
-        return
+def _build_message(subject, body):
+    # Imported on first send: smtplib/email pull in ssl, email.parser, etc., which most runs never need
+    from email.message import EmailMessage
 
     msg = EmailMessage()
     msg.set_content(body)
     msg['Subject'] = subject
     msg['From'] = SENDER_EMAIL
     msg['To'] = RECEIVER_EMAIL
+    return msg
 
-    try:
-        server = smtplib.SMTP(smtp_server, int(smtp_port))
-        server.starttls()
-        server.login(SENDER_EMAIL, APP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        logger.info(f"📧 Email sent: {subject}")
-    except Exception as e:
-        logger.error(f"❌ Failed to send email: {e}")
+def _smtp_connect():
+    import smtplib
+
+    server = smtplib.SMTP(smtp_server, int(smtp_port))
+    server.starttls()
+    server.login(SENDER_EMAIL, APP_PASSWORD)
+    return server
+
+# Background notification queue: callers on hot/error paths enqueue and return immediately
+# instead of blocking on SMTP connect + STARTTLS + login. Each message is still sent as its
+# own email; a burst just shares one warm SMTP session.
+EMAIL_FLUSH_TIMEOUT = 30
+SMTP_IDLE_SECS = 120
+_email_q = queue.Queue()
+_email_thread = None
+_email_thread_lock = threading.Lock()
+_EMAIL_STOP = object()
+_smtp = None  # Warm SMTP session shared by send_email and the email-sender thread
+_smtp_lock = threading.Lock()
+
+def _close_smtp():
+    global _smtp
+    with _smtp_lock:
+        if _smtp is not None:
+            try:
+                _smtp.quit()
+            except Exception:
+                pass
+            _smtp = None
+
+def _send_warm(subject, body):
+    """Sends over the shared warm SMTP session, paying STARTTLS + login only once per burst."""
+    global _smtp
+    if not SENDER_EMAIL or not APP_PASSWORD:
+        logger.warning("⚠️ Email not configured. Skipping email.")
+        return
+
+    msg = _build_message(subject, body)
+    for attempt in range(2):
+        try:
+            with _smtp_lock:
+                if _smtp is not None:
+                    try:
+                        _smtp.noop()
+                    except Exception:
+                        _smtp = None  # server dropped the idle session
+                if _smtp is None:
+                    _smtp = _smtp_connect()
+                _smtp.send_message(msg)
+            logger.info(f"📧 Email sent: {subject}")
+            return
+        except Exception as e:
+            _close_smtp()
+            if attempt:
+                logger.error(f"❌ Failed to send email: {e}")
+
+def send_email(subject, body, device_name="Unknown_Device"):
+    """Sends synchronously, reusing the warm SMTP session when one is open."""
+    _send_warm(subject, body)
+
+def _email_worker():
+    while True:
+        try:
+            # Only wait out the idle timeout while a session is open, then hang up
+            item = _email_q.get(timeout=SMTP_IDLE_SECS if _smtp is not None else None)
+        except queue.Empty:
+            _close_smtp()
+            continue
+        if item is _EMAIL_STOP:
+            _close_smtp()
+            return
+        subject, body, _ = item
+        _send_warm(subject, body)
+
+def _flush_email_queue():
+    if _email_thread and _email_thread.is_alive():
+        _email_q.put(_EMAIL_STOP)
+        _email_thread.join(EMAIL_FLUSH_TIMEOUT)
+    _close_smtp()  # a session opened by send_email has no idle timer behind it
+
+# Deliver queued alerts (e.g. the shutdown email before sys.exit) and hang up on interpreter exit
+atexit.register(_flush_email_queue)
+
+def send_email_async(subject, body, device_name="Unknown_Device"):
+    """Queues a notification for the background sender; never blocks on SMTP."""
+    global _email_thread
+    with _email_thread_lock:
+        if _email_thread is None:
+            _email_thread = threading.Thread(target=_email_worker, name="email-sender", daemon=True)
+            _email_thread.start()
+    _email_q.put((subject, body, device_name))
 
 def get_storage_usage(remote):
     wait_for_internet()
@@ -113,11 +195,14 @@ def get_creds(email):
         with open(token_path, "rb") as f:
             creds = pickle.load(f)
             if creds and creds.expired and creds.refresh_token:
+                # Imported lazily: google.auth is only needed for a refresh, and keeping it out of
+                # module import spares db/query_db.py and the init wizard its startup cost.
+                from google.auth.transport.requests import Request
                 try:
                     # Request refresh with the same scopes we now need
                     creds.refresh(Request())
                     with open(token_path, "wb") as f_out: 
-                        pickle.dump(creds, f_out)
+                        pickle.dump(creds, f_out, protocol=pickle.HIGHEST_PROTOCOL)
                 except Exception as e:
                     logger.error(f"Failed to refresh token: {e}")
                     return None
@@ -0,0 +1,17 @@
+import atexit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared keep-alive session for the Google Photos API calls, so consecutive
+# uploads/batchCreate/album requests reuse one TLS connection instead of
+# handshaking per call. TLS verification is left to requests' defaults (certifi
+# bundle; requests >= 2.32 already shares one preloaded SSL context).
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+
+atexit.register(session.close)
@@ -1,11 +1,21 @@
 import os
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-from datetime import datetime
+import gzip
+from collections import defaultdict, deque
 from dotenv import load_dotenv
 import logging
 
+# Optional fast JSON encoder for Loki push payloads
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Load environment variables
 load_dotenv()
 
@@ -27,6 +37,34 @@ LOKI_PUSH_URL = ""
 if LOKI_URL:
     LOKI_PUSH_URL = LOKI_URL.rstrip("/") + "/loki/api/v1/push"
 
+# Keep-alive session for Loki pushes, so each batch rides the same TCP/TLS connection instead
+# of handshaking per flush. Auth and headers are set once here rather than per request.
+# Loki dedupes identical (timestamp, line) entries, so retrying a push is safe.
+_loki_session = requests.Session()
+_loki_session.auth = (LOKI_USER_ID, LOKI_API_TOKEN)
+_loki_session.headers.update({"Content-type": "application/json"})
+_loki_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 502, 503, 504],
+                      allowed_methods=frozenset({"POST"}))
+)
+_loki_session.mount("https://", _loki_adapter)
+_loki_session.mount("http://", _loki_adapter)
+
+# Push bodies are gzip-compressed (Loki accepts Content-Encoding: gzip on the JSON endpoint);
+# batches repeat labels and message prefixes, so this shrinks them several times over.
+# Bodies below the threshold go out as-is, where compression would only cost CPU.
+LOKI_GZIP_LEVEL = 6
+LOKI_GZIP_MIN_BYTES = 1024
+_GZIP_HEADERS = {"Content-Encoding": "gzip"}
+
+# Static stream labels for every push, built once instead of per batch
+_LOKI_STREAM_LABELS = {
+    level: {"service_name": SERVICE_NAME, "device": DEVICE_NAME, "level": level}
+    for level in ("debug", "info", "warning", "error", "critical")
+}
+
 # Configure a module-level standard logger for local fallback (if needed)
 logging.basicConfig(
     level=logging.INFO,
@@ -39,35 +77,52 @@ logging.basicConfig(
 
 _internal_logger = logging.getLogger("lg")
 
+# Mirror each line to the console/file handlers above. With LOCAL_LOG=false the app logs only
+# to Loki, skipping the stdlib record formatting and handler locks on every call.
+LOCAL_LOG = os.getenv("LOCAL_LOG", "true").lower() in ("1", "true", "yes")
+_LEVEL_NUMBERS = {name: getattr(logging, name) for name in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")}
+# Levels the configured logger lets through (DEBUG is off at the default INFO), checked before any work
+_ENABLED_LEVELS = frozenset(name for name, num in _LEVEL_NUMBERS.items() if _internal_logger.isEnabledFor(num))
+
 import threading
-import queue
 import atexit
 
-# Queue for background log pushing
-log_queue = queue.Queue()
+# Buffer for background log pushing. deque.append/popleft are atomic under the GIL, so
+# producers skip queue.Queue's mutex + condition; the worker polls on its batch timer anyway.
+# Bounded so a long Loki outage can't grow memory forever: when full the oldest line is dropped,
+# counted, and reported as one warning at most every DROP_REPORT_SECS.
+LOG_QUEUE_MAX = 100_000
+DROP_REPORT_SECS = 60
+log_queue = deque(maxlen=LOG_QUEUE_MAX)
+_dropped = 0  # cumulative; only producers write it, the worker reports the delta
 _exit_event = threading.Event()
 
+def _enqueue(item):
+    global _dropped
+    if len(log_queue) >= LOG_QUEUE_MAX:
+        _dropped += 1  # approximate under concurrent producers; it only feeds a warning
+    log_queue.append(item)
+
 def _loki_worker():
+    reported, last_report = 0, 0.0
     while not _exit_event.is_set():
         # Wait up to 5 seconds to batch logs, or until exit is signaled
         _exit_event.wait(5.0)
         
-        batch = []
-        while True:
-            try:
-                # Pluck all available items from the queue
-                log_item = log_queue.get_nowait()
-                if log_item is None:
-                    log_queue.task_done()
-                    continue
-                batch.append(log_item)
-                log_queue.task_done()
-            except queue.Empty:
-                break
-                
+        # Pluck everything queued so far; this thread is the only consumer
+        batch = [log_queue.popleft() for _ in range(len(log_queue))]
+
+        dropped = _dropped - reported
+        if dropped and (time.monotonic() - last_report >= DROP_REPORT_SECS or _exit_event.is_set()):
+            reported += dropped
+            last_report = time.monotonic()
+            drop_msg = f"⚠️ Log buffer full - dropped {dropped} messages"
+            _internal_logger.warning(drop_msg)
+            batch.append((time.time_ns(), "warning", drop_msg))
+
         if batch:
             # Loki requires logs to be strictly in chronological order per stream
-            batch.sort(key=lambda x: int(x[0]))
+            batch.sort(key=lambda x: x[0])
 
             
             # Send in chunks of 1000 to prevent payload size issues
@@ -86,12 +141,15 @@ _worker_thread.start()
 def _cleanup_logger():
     # Signal the thread to wake up and process the final batch immediately
     _exit_event.set()
-    log_queue.put(None) # Give queue a prod just in case
     _worker_thread.join(timeout=5.0)
+    _loki_session.close()
 
 atexit.register(_cleanup_logger)
 
 def _format_and_push(level: str, msg: str, *args):
+    if level not in _ENABLED_LEVELS:
+        return
+
     # Format the message like traditional logging if args exist
     if args:
         try:
@@ -101,20 +159,17 @@ def _format_and_push(level: str, msg: str, *args):
     else:
         formatted_msg = str(msg)
 
-    # Capture the current time ONCE — this is the single source of truth
-    now = datetime.now()
+    # Capture the current time ONCE — this is the single source of truth.
+    # time_ns() is already an int, so there's no float multiply/rounding per call.
+    timestamp_ns = time.time_ns()
 
     # Still log to console/file for visibility (the internal logger adds its own timestamp)
-    if level == "INFO": _internal_logger.info(formatted_msg)
-    elif level == "WARNING": _internal_logger.warning(formatted_msg)
-    elif level == "ERROR": _internal_logger.error(formatted_msg)
-    elif level == "CRITICAL": _internal_logger.critical(formatted_msg)
-    elif level == "DEBUG": _internal_logger.debug(formatted_msg)
+    if LOCAL_LOG:
+        _internal_logger.log(_LEVEL_NUMBERS[level], formatted_msg)
 
-    # Use the application's datetime as Loki's timestamp (not upload time).
+    # Use the application's timestamp as Loki's timestamp (not upload time).
     # Level is sent as a Loki label, so no need to embed it in the log text.
-    timestamp_ns = str(int(now.timestamp() * 1e9))
-    log_queue.put((timestamp_ns, level.lower(), formatted_msg))
+    _enqueue((timestamp_ns, level.lower(), formatted_msg))
 
 def info(msg, *args, **kwargs):
     _format_and_push("INFO", msg, *args)
@@ -133,8 +188,16 @@ def debug(msg, *args, **kwargs):
 
 def push_to_loki(log_line):
     # Backward compatibility if anything calls this directly
-    timestamp_ns = str(time.time_ns())
-    log_queue.put((timestamp_ns, "info", log_line))
+    _enqueue((time.time_ns(), "info", log_line))
+
+def _dumps_payload(payload):
+    """Compact UTF-8 JSON for a push payload, using orjson when it is installed."""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(payload)
+        except orjson.JSONEncodeError:
+            pass  # e.g. lone surrogates in a log line; the stdlib encoder escapes them
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
 
 def _push_batch_to_loki(batch):
     """Pushes a batch of log lines to the Loki server, grouped by level."""
@@ -142,37 +205,32 @@ def _push_batch_to_loki(batch):
         return
 
     # Group log entries by level so each level gets its own Loki stream
-    from collections import defaultdict
     level_groups = defaultdict(list)
     level_last_ts = defaultdict(int)
 
-    for timestamp_ns, level, log_line in batch:
-        ts = int(timestamp_ns)
+    for ts, level, log_line in batch:
         # Ensure timestamps are strictly increasing per stream
         if ts <= level_last_ts[level]:
             ts = level_last_ts[level] + 1
         level_last_ts[level] = ts
         level_groups[level].append([str(ts), log_line.strip()])
 
-    streams = []
-    for level, values in level_groups.items():
-        streams.append({
-            "stream": {
-                "service_name": SERVICE_NAME,
-                "device": DEVICE_NAME,
-                "level": level
-            },
-            "values": values
-        })
+    payload = {"streams": [
+        {"stream": _LOKI_STREAM_LABELS[level], "values": values}
+        for level, values in level_groups.items()
+    ]}
 
-    payload = {"streams": streams}
+    body = _dumps_payload(payload)
+    headers = None
+    if len(body) >= LOKI_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=LOKI_GZIP_LEVEL)
+        headers = _GZIP_HEADERS
 
     try:
-        response = requests.post(
+        response = _loki_session.post(
             LOKI_PUSH_URL,
-            auth=(LOKI_USER_ID, LOKI_API_TOKEN),
-            headers={"Content-type": "application/json"},
-            json=payload,
+            data=body,
+            headers=headers,
             timeout=10
         )
         
@@ -182,6 +240,28 @@ def _push_batch_to_loki(batch):
     except Exception as e:
         print(f"⚠️ Loki connection error during batch push: {e}")
 
+def _file_change_event(file_path):
+    """Returns an Event set whenever file_path is modified, or None if watchdog isn't installed."""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    changed = threading.Event()
+    target = os.path.abspath(file_path)
+
+    class _Handler(FileSystemEventHandler):
+        def on_modified(self, event):
+            if os.path.abspath(event.src_path) == target:
+                changed.set()
+
+    observer = Observer()
+    observer.daemon = True
+    observer.schedule(_Handler(), os.path.dirname(target), recursive=False)
+    observer.start()
+    return changed
+
 def watch_log_file(file_path):
     """Tails the log file continuously and pushes new lines to Loki."""
     if not os.path.exists(file_path):
@@ -190,6 +270,8 @@ def watch_log_file(file_path):
             time.sleep(1)
             
     print(f"👀 Watching {file_path} for new logs...")
+    # With watchdog installed, sleep until the file is written instead of polling every 0.5s
+    changed = _file_change_event(file_path)
     
     with open(file_path, "r", encoding="utf-8") as file:
         # Seek to the end of the file to only read new logs
@@ -198,7 +280,11 @@ def watch_log_file(file_path):
         while True:
             line = file.readline()
             if not line:
-                time.sleep(0.5) # Wait briefly before checking again
+                if changed is None:
+                    time.sleep(0.5) # Wait briefly before checking again
+                else:
+                    changed.wait(5.0) # Timeout only as a safety net for a missed event
+                    changed.clear()
                 continue
                 
             push_to_loki(line)
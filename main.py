@@ -154,7 +154,11 @@ def main(dry_run=False, _restart_count=0):
         "creds": creds,
         "should_restart": False,
         "session_uploads": [],
-        "session_total_size": 0
+        "session_total_size": 0,
+        # Last `rclone about` result and where it was taken (see core.uploader._storage_usage)
+        "storage_usage": None,
+        "usage_check_bytes": 0,
+        "files_since_usage_check": 0
     }
 
     # Worker Contexts
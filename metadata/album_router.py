@@ -1,9 +1,9 @@
 import os
 import json
-import requests
 import infra.logger as logger
+from infra.http import session
 from metadata.extractor import get_photo_metadata
-from infra.auth import send_email, wait_for_internet
+from infra.auth import send_email_async, wait_for_internet
 
 def get_assigned_album(filepath, active_trips):
     """
@@ -79,7 +79,7 @@ def get_or_create_album(creds, album_name, db, email, accounts, albums_cache, sa
             params = {"pageSize": 50}
             if page_token:
                 params["pageToken"] = page_token
-            list_resp = requests.get(
+            list_resp = session.get(
                 'https://photoslibrary.googleapis.com/v1/albums',
                 headers=headers, params=params, timeout=30
             )
@@ -109,7 +109,7 @@ def get_or_create_album(creds, album_name, db, email, accounts, albums_cache, sa
 
         # 3. Album not found — create it
         payload = {"album": {"title": album_name}}
-        resp = requests.post('https://photoslibrary.googleapis.com/v1/albums', headers=headers, json=payload, timeout=30)
+        resp = session.post('https://photoslibrary.googleapis.com/v1/albums', headers=headers, json=payload, timeout=30)
 
         if resp.status_code == 200:
             data = resp.json()
@@ -135,13 +135,13 @@ def get_or_create_album(creds, album_name, db, email, accounts, albums_cache, sa
                         f"🔗 Link to album: {album_url}\n\n"
                         f"IMPORTANT: Please open the link above for {email} and manually share "
                         f"this album with your main account to merge them together!")
-                send_email(subject, body)
+                send_email_async(subject, body)
             else:
                 subject = f"📸 New Trip Album Created: {album_name}"
                 body = (f"A brand new album was created for trip '{album_name}' "
                         f"on account: {email}.\n\n"
                         f"🔗 Link to album: {album_url}")
-                send_email(subject, body)
+                send_email_async(subject, body)
 
             return album_id, new_saved_id
         else:
@@ -39,16 +39,27 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+# How long ensure_schema waits on a DB locked by a running upload before giving up
+SCHEMA_BUSY_TIMEOUT_MS = 5000
+
 # Ensure schema has thumbid column if user runs web UI before main script
 def ensure_schema():
     if os.path.exists(DB_PATH):
+        conn = get_db_connection()
+        # The uploader may hold a write lock; wait for it rather than failing on the first try
+        conn.execute(f"PRAGMA busy_timeout = {SCHEMA_BUSY_TIMEOUT_MS}")
         try:
-            conn = get_db_connection()
-            conn.execute("ALTER TABLE media_library ADD COLUMN thumbid TEXT")
-            conn.commit()
+            cols = {row["name"] for row in conn.execute("PRAGMA table_info(media_library)")}
+            # Empty when the table doesn't exist yet; the main script creates it with thumbid
+            if cols and "thumbid" not in cols:
+                conn.execute("ALTER TABLE media_library ADD COLUMN thumbid TEXT")
+                conn.commit()
+        except sqlite3.OperationalError as e:
+            # Still locked after the timeout: serve anyway, the main script adds thumbid itself
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+        finally:
             conn.close()
-        except sqlite3.OperationalError:
-            pass # Column already exists, all good!
 
 ensure_schema()
 